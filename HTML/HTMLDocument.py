@@ -0,0 +1,320 @@
+"""
+columnar storage for very large HTML trees
+
+every element is a number and its fields live in parallel arrays instead of one object per element:
+tag, parent, first and last sub-element, next sibling and text are arrays of int32,
+the attrs of element n are the pairs attr_keys[i], attr_values[i] for attr_starts[n] <= i < attr_starts[n + 1],
+tags, attr keys and attr values are numbers in a table of distinct strings and the texts are utf-8
+in one buffer, text_refs[n] is the number of the text of element n (-1 for no text).
+elements are only added, so while every element is added at the end of the document (like a parser or
+from_element does) the numbers follow document order, a sub tree is a range of numbers and scans over the
+arrays run in C with array.index
+"""
+import sys
+from array import array
+from bisect import bisect_right
+from typing import IO, Dict, Iterator, List, Optional, Set, Tuple
+
+from HTML.HTMLElement import HTMLElement, RENDER_BUFFER_SIZE, _Document, _NO_ATTRS, _gc_paused, _open_tag
+
+NONE = -1
+
+
+class HTMLDocument:
+    """ a tree of elements stored in arrays, see the module docstring """
+    __slots__ = (
+        'strings', '_string_ids', 'text_data', 'text_starts', 'tags', 'parents', 'firsts', 'lasts', 'nexts', 'text_refs',
+        'attr_starts', 'attr_keys', 'attr_values', 'ids', '_ordered',
+    )
+
+    def __init__(self) -> None:
+        self.strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        """ text number n is text_data[text_starts[n]:text_starts[n + 1]] """
+        self.text_data = bytearray()
+        self.text_starts = array('q', [0])
+        self.tags = array('i')
+        self.parents = array('i')
+        self.firsts = array('i')
+        self.lasts = array('i')
+        self.nexts = array('i')
+        self.text_refs = array('i')
+        self.attr_starts = array('i', [0])
+        self.attr_keys = array('i')
+        self.attr_values = array('i')
+        self.ids: Dict[str, int] = {}
+        """ True while the element numbers follow document order """
+        self._ordered = True
+
+    def __len__(self) -> int:
+        return len(self.tags)
+
+    def _string(self, text: str) -> int:
+        number = self._string_ids.get(text)
+        if number is None:
+            number = self._string_ids[text] = len(self.strings)
+            self.strings.append(text)
+        return number
+
+    def _text(self, text_ref: int) -> str:
+        return self.text_data[self.text_starts[text_ref]:self.text_starts[text_ref + 1]].decode('utf-8')
+
+    def _last_descendant(self, node: int) -> int:
+        lasts = self.lasts
+        while lasts[node] != NONE:
+            node = lasts[node]
+        return node
+
+    def _add(self, parent: int, name: str, text: Optional[str], attrs: Dict[str, str]) -> int:
+        """ add an element without validation """
+        node = len(self.tags)
+        self.tags.append(self._string(name))
+        self.parents.append(parent)
+        self.firsts.append(NONE)
+        self.lasts.append(NONE)
+        self.nexts.append(NONE)
+        if text is None:
+            self.text_refs.append(NONE)
+        else:
+            self.text_refs.append(len(self.text_starts) - 1)
+            self.text_data += text.encode('utf-8')
+            self.text_starts.append(len(self.text_data))
+        for key, val in attrs.items():
+            self.attr_keys.append(self._string(key))
+            self.attr_values.append(self._string(val))
+        self.attr_starts.append(len(self.attr_keys))
+        if parent != NONE:
+            last = self.lasts[parent]
+            if last == NONE:
+                self.firsts[parent] = node
+            else:
+                self.nexts[last] = node
+            self.lasts[parent] = node
+        return node
+
+    def append(
+        self, parent: Optional[int], name: str, value: Optional[str] = None, attrs: Optional[dict] = None
+    ) -> int:
+        """ add an element as the last sub-element of parent (the root when parent is None) and return its number """
+        if name not in HTMLElement.VALID_TAGS:
+            raise Exception(f'{name} not vaild name of tag in the HTML')
+        if attrs is None:
+            attrs = {}
+        if not isinstance(attrs, dict):
+            raise TypeError('attrs must be a dict')
+        if parent is None:
+            if self.tags:
+                raise ValueError('the document already has a root')
+        elif not 0 <= parent < len(self.tags):
+            raise IndexError(f'no element {parent} in the document')
+        if 'id' in attrs and attrs['id'] in self.ids:
+            raise Exception('Duplicate ID, Faild to append')
+        if parent is not None and self._ordered and self._last_descendant(parent) != len(self.tags) - 1:
+            self._ordered = False
+        node = self._add(NONE if parent is None else parent, name, value, attrs)
+        if 'id' in attrs:
+            self.ids[attrs['id']] = node
+        return node
+
+    def append_element(self, parent: Optional[int], element: HTMLElement) -> int:
+        """ copy the tree of element as the last sub-element of parent (the root when parent is None) """
+        ids = [node._attrs['id'] for node in HTMLElement.iter_preorder(element) if 'id' in node._attrs]
+        if not self.ids.keys().isdisjoint(ids) or len(set(ids)) != len(ids):
+            raise Exception('Duplicate ID, Faild to append')
+        numbers: Dict[HTMLElement, int] = {}
+        for node in HTMLElement.iter_preorder(element):
+            if node is element or node.parent is None:
+                numbers[node] = self.append(parent, node._name, node._text, dict(node._attrs))
+                continue
+            number = numbers[node] = self._add(numbers[node.parent], node._name, node._text, node._attrs)
+            if 'id' in node._attrs:
+                self.ids[node._attrs['id']] = number
+        return numbers[element]
+
+    @classmethod
+    def from_element(cls, root: HTMLElement) -> 'HTMLDocument':
+        """ the document holding a copy of the tree of root """
+        document = cls()
+        document.append_element(None, root)
+        return document
+
+    def to_element(self, node: int = 0) -> HTMLElement:
+        """ build the HTMLElement tree of the sub tree of node """
+        doc = _Document()
+        new = HTMLElement._new
+        link = HTMLElement._link
+        strings = self.strings
+        elements: Dict[int, HTMLElement] = {}
+        with _gc_paused():
+            for number in self.iter_preorder(node):
+                attrs = self.attrs(number) or _NO_ATTRS
+                text_ref = self.text_refs[number]
+                element = new(sys.intern(strings[self.tags[number]]), attrs, self._text(text_ref) if text_ref != NONE else None)
+                element._doc = doc
+                if 'id' in attrs:
+                    doc.ids[attrs['id']] = element
+                elements[number] = element
+                if number != node:
+                    link(elements[self.parents[number]], element)
+        return elements[node]
+
+    def name(self, node: int) -> str:
+        """ tag name of the element """
+        return self.strings[self.tags[node]]
+
+    def text(self, node: int) -> Optional[str]:
+        """ the text of the element, None when it has no text """
+        text_ref = self.text_refs[node]
+        return self._text(text_ref) if text_ref != NONE else None
+
+    def attrs(self, node: int) -> Dict[str, str]:
+        """ a copy of the attributes of the element """
+        strings = self.strings
+        start, stop = self.attr_starts[node], self.attr_starts[node + 1]
+        return {strings[self.attr_keys[i]]: strings[self.attr_values[i]] for i in range(start, stop)}
+
+    def parent(self, node: int) -> Optional[int]:
+        """ the parent of the element, None for the root """
+        parent = self.parents[node]
+        return None if parent == NONE else parent
+
+    def children(self, node: int) -> List[int]:
+        """ the sub-elements of the element """
+        children = []
+        child = self.firsts[node]
+        while child != NONE:
+            children.append(child)
+            child = self.nexts[child]
+        return children
+
+    def get_element_by_id(self, id: str) -> Optional[int]:
+        """ find the element with the id from the id registry """
+        return self.ids.get(id)
+
+    def walk(self, node: int = 0) -> Iterator[Tuple[int, int, bool]]:
+        """ yield (element, depth, entering) when an element is entered and again when it is left, like HTMLElement.walk """
+        firsts, nexts, parents = self.firsts, self.nexts, self.parents
+        root, depth = node, 0
+        yield node, depth, True
+        while True:
+            child = firsts[node]
+            if child != NONE:
+                node, depth = child, depth + 1
+                yield node, depth, True
+                continue
+            while True:
+                yield node, depth, False
+                if node == root:
+                    return
+                sibling = nexts[node]
+                if sibling != NONE:
+                    node = sibling
+                    yield node, depth, True
+                    break
+                node, depth = parents[node], depth - 1
+
+    def iter_preorder(self, node: int = 0) -> Iterator[int]:
+        """ yield the element and its sub-elements in document order, a range of numbers while they are ordered """
+        if self._ordered:
+            return iter(range(node, self._last_descendant(node) + 1))
+        return (number for number, _, entering in self.walk(node) if entering)
+
+    def _scan(self, column: array, value: int, start: int, stop: int) -> Iterator[int]:
+        """ the positions of value in column[start:stop], found by array.index in C """
+        position = start
+        while True:
+            try:
+                position = column.index(value, position, stop)
+            except ValueError:
+                return
+            yield position
+            position += 1
+
+    def _in_document_order(self, node: int, found: Iterator[int]) -> List[int]:
+        """ the found elements inside the sub tree of node in document order, they come in number order """
+        if self._ordered:
+            return list(found)
+        matches = set(found)
+        return [number for number in self.iter_preorder(node) if number in matches]
+
+    def _subtree_attrs(self, node: int) -> Tuple[int, int]:
+        """ the range of attr positions worth scanning for the sub tree of node """
+        if self._ordered:
+            return self.attr_starts[node], self.attr_starts[self._last_descendant(node) + 1]
+        return 0, len(self.attr_keys)
+
+    def find_element_by_tag_name(self, tag_name: str, node: int = 0) -> List[int]:
+        """ find elements by tag name in the sub tree of node """
+        tag = self._string_ids.get(tag_name)
+        if tag is None or not self.tags:
+            return []
+        stop = self._last_descendant(node) + 1 if self._ordered else len(self.tags)
+        return self._in_document_order(node, self._scan(self.tags, tag, node if self._ordered else 0, stop))
+
+    def find_element_by_attrs(self, key: str, value: str, node: int = 0) -> List[int]:
+        """ find elements by attr in the sub tree of node """
+        key_ref, value_ref = self._string_ids.get(key), self._string_ids.get(value)
+        if key_ref is None or value_ref is None or not self.tags:
+            return []
+        start, stop = self._subtree_attrs(node)
+        attr_keys, attr_starts = self.attr_keys, self.attr_starts
+        found = (
+            bisect_right(attr_starts, position) - 1
+            for position in self._scan(self.attr_values, value_ref, start, stop) if attr_keys[position] == key_ref
+        )
+        return self._in_document_order(node, found)
+
+    def find_element_by_class(self, class_name: str, node: int = 0) -> List[int]:
+        """ find elements having class_name among the tokens of their class attr in the sub tree of node """
+        class_ref = self._string_ids.get('class')
+        if class_ref is None or not self.tags:
+            return []
+        values: Set[int] = {i for i, string in enumerate(self.strings) if class_name in string.split()}
+        start, stop = self._subtree_attrs(node)
+        attr_values, attr_starts = self.attr_values, self.attr_starts
+        found = (
+            bisect_right(attr_starts, position) - 1
+            for position in self._scan(self.attr_keys, class_ref, start, stop) if attr_values[position] in values
+        )
+        return self._in_document_order(node, found)
+
+    def iter_render(self, node: int = 0, space: int = 0) -> Iterator[str]:
+        """ yield the html of the sub tree of node chunk by chunk, the same html as HTMLElement.render """
+        strings, tags, text_refs = self.strings, self.tags, self.text_refs
+        attr_starts, attr_keys, attr_values = self.attr_starts, self.attr_keys, self.attr_values
+        sibling_closed = False
+        for number, depth, entering in self.walk(node):
+            indent = ' ' * (space + 4 * depth)
+            if entering:
+                if sibling_closed:
+                    yield '\n'
+                    sibling_closed = False
+                text_ref = text_refs[number]
+                attrs = [
+                    (strings[attr_keys[i]], strings[attr_values[i]])
+                    for i in range(attr_starts[number], attr_starts[number + 1])
+                ]
+                yield f'{indent}{_open_tag(strings[tags[number]], attrs, self._text(text_ref) if text_ref != NONE else "")}\n'
+            else:
+                yield f'{indent}</{strings[tags[number]]}>\n'
+                sibling_closed = True
+
+    def render(self, node: int = 0, space: int = 0) -> str:
+        """ render the element and its sub-elements like HTMLElement.render """
+        if not self.tags:
+            return 'the element empty'
+        return ''.join(self.iter_render(node, space))
+
+    def render_to(self, stream: IO[str], node: int = 0, space: int = 0) -> None:
+        """ write the rendered html to any file-like object without building the whole string """
+        buffer: List[str] = []
+        size = 0
+        for chunk in self.iter_render(node, space):
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= RENDER_BUFFER_SIZE:
+                stream.write(''.join(buffer))
+                buffer.clear()
+                size = 0
+        if buffer:
+            stream.write(''.join(buffer))
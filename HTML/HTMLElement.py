@@ -1,13 +1,415 @@
-import random
-from typing import Union, List, Optional
+import asyncio
+import gc
+import os
+import re
+import sys
+import zlib
+from bisect import bisect_left, bisect_right
+from collections import deque
+from contextlib import contextmanager
+from hashlib import blake2b
+from html.parser import HTMLParser
+from typing import IO, Any, AsyncIterator, Callable, Collection, ContextManager, Dict, Iterable, Iterator, Mapping, Union, List, Optional, Set, Tuple, cast
 HTMLElementValue = Union[str,'HTMLElement', list['HTMLElement']]
+RENDER_BUFFER_SIZE = 1 << 16
+PARSE_CHUNK_SIZE = 1 << 16
+""" zlib window bits of the compressed render formats, gzip and deflate as in http content-encoding """
+COMPRESSION_WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+""" elements rendered by the async renderers before the event loop gets a turn """
+ASYNC_RENDER_SLICE = 256
+Prune = Optional[Callable[['HTMLElement'], bool]]
+""" a {name} placeholder in a text or an attr value of a template tree """
+PLACEHOLDER = re.compile(r'\{([A-Za-z_]\w*)\}')
+""" a placeholder or a doubled brace, {{ and }} stand for literal braces as in format strings """
+_TEMPLATE_TOKEN = re.compile(r'\{\{|\}\}|' + PLACEHOLDER.pattern)
+
+
+""" characters escaped in texts and attr values, the text of script and style is left as it is """
+_SPECIAL = re.compile('[&<>"]')
+RAW_TEXT_TAGS = {'script', 'style'}
+
+
+def escape(text: str, quote: bool = True) -> str:
+    """ escape &, < and > (and " when quote is True) for html """
+    if _SPECIAL.search(text) is None:
+        return text
+    text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    return text.replace('"', '&quot;') if quote else text
+
+
+def _open_tag(name: str, attrs: Collection[Tuple[str, str]], text: str) -> str:
+    """ 
+    the opening tag followed by the text, the attrs are serialized as they are and a few scans of the result
+    tell if anything needs escaping, which is rare, so the common case costs no more than without escaping
+    """
+    if attrs:
+        attribute = ' '.join([f'{key}="{val}"' for key, val in attrs])
+        probe = attribute + text
+        if '&' in probe or '<' in probe or '>' in probe or probe.count('"') != 2 * len(attrs):
+            return _open_tag_escaped(name, attrs, text)
+        return f'<{name} {attribute}>{text}'
+    if '&' in text or '<' in text or '>' in text:
+        return _open_tag_escaped(name, attrs, text)
+    return f'<{name}>{text}'
+
+
+def _open_tag_escaped(name: str, attrs: Collection[Tuple[str, str]], text: str) -> str:
+    if name not in RAW_TEXT_TAGS:
+        text = escape(text, quote=False)
+    if not attrs:
+        return f'<{name}>{text}'
+    attribute = ' '.join([f'{key}="{escape(str(val))}"' for key, val in attrs])
+    return f'<{name} {attribute}>{text}'
+
+
+class _SharedAttrs(dict):
+    """ 
+    attrs shared by several elements (the empty attrs of every element without attributes
+    and the attrs of copy-on-write clones), an element copies them to a plain dict before writing
+    """
+    __slots__ = ()
+
+    def _read_only(self, *args: object, **kwargs: object) -> None:
+        raise TypeError('shared attrs are read only')
+
+    __setitem__ = __delitem__ = update = pop = popitem = clear = setdefault = _read_only  # type: ignore[assignment]
+
+
+_NO_ATTRS: Dict[str, str] = _SharedAttrs()
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    """ bulk builders make many objects that can not be garbage yet, the cyclic collector only slows them down """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+""" a change made inside HTMLElement.batch, its kind followed by what is needed to undo it """
+Journal = List[Tuple[Any, ...]]
+
+
+class _Document:
+    """ 
+    the id registry shared by all the elements of one tree, a merged registry
+    forwards to the one that absorbed it so every element can reach the root's registry,
+    batch holds the changes made inside HTMLElement.batch so they can be undone and renders the html
+    of sub trees rendered with cache=True keyed by (digest, indentation), shared by identical sub trees of the tree
+    """
+    __slots__ = ('ids', 'forward', 'index', 'clone_seq', 'batch', 'renders')
+
+    def __init__(self, ids: Optional[Dict[str, 'HTMLElement']] = None) -> None:
+        self.ids: Dict[str, 'HTMLElement'] = ids if ids is not None else {}
+        self.forward: Optional['_Document'] = None
+        self.index: Optional['_Index'] = None
+        self.clone_seq = 0
+        self.batch: Optional[Journal] = None
+        self.renders: Optional[Dict[Tuple[bytes, int], str]] = None
+
+
+Bucket = Dict['HTMLElement', None]
+""" deepest append at the end of an indexed tree that keeps the document positions fresh """
+NUMBER_DEPTH = 64
+
+
+class _Index:
+    """ 
+    secondary indexes of a tree: tag name, (attr, value) and class token to elements,
+    order holds the document position of each element and ends the position of the last element of its sub tree,
+    so a sub tree is the interval order[element] .. ends[element], both are rebuilt lazily when order is None
+    """
+    __slots__ = ('tags', 'attrs', 'classes', 'order', 'ends', 'next_order', 'ranked')
+
+    def __init__(self) -> None:
+        self.tags: Dict[str, Bucket] = {}
+        self.attrs: Dict[Tuple[str, str], Bucket] = {}
+        self.classes: Dict[str, Bucket] = {}
+        self.order: Optional[Dict['HTMLElement', int]] = {}
+        self.ends: Dict['HTMLElement', int] = {}
+        self.next_order = 0
+        """ buckets sorted by document position for range scans, dropped on any change """
+        self.ranked: Dict[int, Tuple[Bucket, List[int], List['HTMLElement']]] = {}
+
+    @staticmethod
+    def _discard(buckets: dict, key: object, element: 'HTMLElement') -> None:
+        bucket = buckets.get(key)
+        if bucket is not None:
+            bucket.pop(element, None)
+            if not bucket:
+                del buckets[key]
+
+    def add(self, element: 'HTMLElement') -> None:
+        self.ranked.clear()
+        self.tags.setdefault(element._name, {})[element] = None
+        for key, value in element._attrs.items():
+            self.add_attr(element, key, value)
+
+    def discard(self, element: 'HTMLElement') -> None:
+        self.ranked.clear()
+        self._discard(self.tags, element._name, element)
+        for key, value in element._attrs.items():
+            self.discard_attr(element, key, value)
+        if self.order is not None:
+            self.order.pop(element, None)
+            self.ends.pop(element, None)
+
+    def add_attr(self, element: 'HTMLElement', key: str, value: str) -> None:
+        self.ranked.clear()
+        self.attrs.setdefault((key, value), {})[element] = None
+        if key == 'class':
+            for token in value.split():
+                self.classes.setdefault(token, {})[element] = None
+
+    def discard_attr(self, element: 'HTMLElement', key: str, value: str) -> None:
+        self.ranked.clear()
+        self._discard(self.attrs, (key, value), element)
+        if key == 'class':
+            for token in value.split():
+                self._discard(self.classes, token, element)
+
+    def number(self, element: 'HTMLElement') -> None:
+        """ 
+        give the next document positions to a sub tree appended at the end of the tree, the ends of all its
+        ancestors move too so below NUMBER_DEPTH ancestors the positions are left stale to be rebuilt lazily
+        """
+        order, ends = self.order, self.ends
+        if order is None:
+            return
+        ancestor, depth = element.parent, 0
+        while ancestor is not None:
+            depth += 1
+            if depth > NUMBER_DEPTH:
+                self.renumber()
+                return
+            ancestor = ancestor.parent
+        self.ranked.clear()
+        for node, _, entering in HTMLElement.walk(element):
+            if entering:
+                order[node] = self.next_order
+                self.next_order += 1
+            else:
+                ends[node] = self.next_order - 1
+        parent = element.parent
+        while parent is not None:
+            ends[parent] = self.next_order - 1
+            parent = parent.parent
+
+    def renumber(self) -> None:
+        """ the document positions are stale after a change elsewhere than at the end of the tree """
+        self.order = None
+        self.ends = {}
+        self.ranked.clear()
+
+    def at_end(self, element: 'HTMLElement') -> bool:
+        """ check if nothing follows the sub tree of the element in document order, while the positions are fresh """
+        return self.order is not None and self.ends.get(element) == self.next_order - 1
+
+    def ordered(self, root: 'HTMLElement') -> Dict['HTMLElement', int]:
+        if self.order is None:
+            self.order = {}
+            self.next_order = 0
+            self.number(root)
+        return self.order
+
+    def ranked_bucket(self, bucket: Bucket) -> Tuple[List[int], List['HTMLElement']]:
+        """ the positions and the elements of a bucket in document order, while the positions are fresh """
+        entry = self.ranked.get(id(bucket))
+        if entry is None or entry[0] is not bucket:
+            order = self.order
+            assert order is not None
+            elements = sorted(bucket, key=order.__getitem__)
+            entry = self.ranked[id(bucket)] = (bucket, [order[element] for element in elements], elements)
+        return entry[1], entry[2]
+
+
+class _AttrMap(dict):
+    """ 
+    the attrs of an element as a plain dict (for json and isinstance checks), a copy taken when it is read
+    whose writes also go through the element bookkeeping so the id registry and the indexes stay up to date
+    """
+    __slots__ = ('_element',)
+
+    def __init__(self, element: 'HTMLElement') -> None:
+        super().__init__(element._attrs)
+        self._element = element
+
+    def __setitem__(self, key: str, value: str) -> None:
+        self._element._set_attr(key, value)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self._element._attrs:
+            raise KeyError(key)
+        self._element._del_attr(key)
+        dict.__delitem__(self, key)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def pop(self, key: str, *default: Any) -> Any:
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        if default:
+            return default[0]
+        raise KeyError(key)
+
+    def popitem(self) -> Tuple[str, str]:
+        if not self:
+            raise KeyError('popitem(): attrs are empty')
+        key = next(reversed(self))
+        return key, self.pop(key)
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def clear(self) -> None:
+        for key in list(self):
+            del self[key]
+
+    def __ior__(self, other: Any) -> '_AttrMap':  # type: ignore[override, misc]
+        self.update(other)
+        return self
+
+
+class _ValueList(list):
+    """ 
+    the text and the sub-elements of an element, append and remove go through HTMLElement.append
+    and detach like the list value of older versions, other in place changes raise TypeError
+    """
+    __slots__ = ('_element',)
+
+    def __init__(self, element: 'HTMLElement') -> None:
+        super().__init__()
+        self._element = element
+        self._sync()
+
+    def _sync(self) -> None:
+        element = self._element
+        list.clear(self)
+        if element._text is not None:
+            list.append(self, element._text)
+        list.extend(self, element.iter_children())
+
+    def append(self, value: Any) -> None:
+        HTMLElement.append(self._element, value)
+        self._sync()
+
+    def extend(self, values: Iterable[Any]) -> None:
+        for value in list(values):
+            HTMLElement.append(self._element, value)
+        self._sync()
+
+    def __iadd__(self, values: Iterable[Any]) -> '_ValueList':  # type: ignore[override, misc]
+        self.extend(values)
+        return self
+
+    def remove(self, value: Any) -> None:
+        element = self._element
+        if isinstance(value, HTMLElement) and value.parent is element:
+            value.detach()
+        elif isinstance(value, str) and value == element._text:
+            element.text = None
+        else:
+            raise ValueError(f'{value!r} not in the value of the element')
+        self._sync()
+
+    def _read_only(self, *args: object, **kwargs: object) -> Any:
+        raise TypeError('the value of an element changes through append, remove or the value setter')
+
+    __setitem__ = __delitem__ = insert = pop = clear = sort = reverse = __imul__ = _read_only  # type: ignore[assignment]
+
+
+""" the text of script and style elements in rendered html """
+_RAW_TEXT = re.compile(r'<(script|style)\b[^>]*>(.*?)</\1>', re.S)
+""" 
+the key of the unescaped values in a template format string, {name} inside script and style becomes
+{ raw[name]}, the space keeps it apart from the placeholder names
+"""
+_RAW_KEY = ' raw'
+
+
+class _Escaped:
+    """ the values of a template render, escaped as format_map reads them, unescaped under _RAW_KEY """
+    __slots__ = ('values',)
+
+    def __init__(self, values: Mapping[str, Any]) -> None:
+        self.values = values
+
+    def __getitem__(self, key: str) -> Any:
+        if key == _RAW_KEY:
+            return self.values
+        return escape(str(self.values[key]))
+
+
+def _hashed(element: 'HTMLElement') -> bool:
+    return element._hash is not None
+
+
+""" sub trees whose html is kept for the identical sub trees of a document """
+SHARED_RENDERS_SIZE = 4096
+
+
+class Template:
+    """ 
+    render function compiled from a tree with {name} placeholders, 
+    the html is kept as one format string so a render is a single format_map call,
+    values are escaped like attr values unless escape is False, the text of script and style is left as it is
+    """
+    __slots__ = ('source', 'fields', 'escape')
+
+    def __init__(self, html: str, escape: bool = True) -> None:
+        self.escape = escape
+        raw = [match.span(2) for match in _RAW_TEXT.finditer(html)] if escape else []
+        pieces: List[str] = []
+        names: List[str] = []
+        last = 0
+        for match in _TEMPLATE_TOKEN.finditer(html):
+            pieces.append(html[last:match.start()].replace('{', '{{').replace('}', '}}'))
+            name = match.group(1)
+            last = match.end()
+            if name is None:
+                pieces.append(match.group())
+                continue
+            names.append(name)
+            if any(start <= match.start() < end for start, end in raw):
+                pieces.append(f'{{{_RAW_KEY}[{name}]}}')
+            else:
+                pieces.append(f'{{{name}}}')
+        pieces.append(html[last:].replace('{', '{{').replace('}', '}}'))
+        self.source = ''.join(pieces)
+        self.fields = tuple(dict.fromkeys(names))
+
+    def __call__(self, values: Optional[Mapping[str, Any]] = None, **kwargs: Any) -> str:
+        """ render with the values of the placeholders, a missing value raises KeyError """
+        if kwargs:
+            values = {**values, **kwargs} if values else kwargs
+        if self.escape:
+            return self.source.format_map(_Escaped(values or {}))
+        return self.source.format_map(values or {})
+
+    def __repr__(self) -> str:
+        return f'Template(fields={self.fields})'
+
 
 class HTMLElement:
+    __slots__ = ('_name', '_attrs', '_text', 'parent', '_first', '_last', '_prev', '_next', '_doc', '_cache', '_open', '_hash')
     VALID_TAGS = {
         'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'a', 'p', 'table', 'tr', 'td', 'th',
         'href', 'link', 'label', 'input', 'button', 'form', 'nav', 'body', 'style',
         'script', 'html', 'header', 'span', 'div',
     }
+    """ hits and misses of render(..., cache=True) """
+    RENDER_CACHE_STATS: Dict[str, int] = {'hits': 0, 'misses': 0}
  
     def __init__(
         self, name: str, value: HTMLElementValue, attrs: Optional[dict] = None
@@ -15,97 +417,934 @@ class HTMLElement:
         """ constructor: initialize instance of HTMLElement  """ 
         if name not in HTMLElement.VALID_TAGS:
             raise Exception(f'{name} not vaild name of tag in the HTML')
-        self.attrs = attrs if attrs is not None else {}  
-        self.value: List[Union[str, 'HTMLElement']] = []
-        self.name = name
-        self.ids = set() 
+        if attrs is not None and not isinstance(attrs, dict):
+            raise TypeError('attrs must be a dict')
+        self._name = sys.intern(name)
+        self._attrs: Dict[str, str] = (
+            {sys.intern(key): val for key, val in attrs.items()} if attrs else _NO_ATTRS
+        )
+        self._text: Optional[str] = None
         self.parent: Optional['HTMLElement'] = None
-        if 'id' in self.attrs:
-            self.ids.add(self.attrs['id'])
+        """ sub-elements are a doubly linked list of siblings """
+        self._first: Optional['HTMLElement'] = None
+        self._last: Optional['HTMLElement'] = None
+        self._prev: Optional['HTMLElement'] = None
+        self._next: Optional['HTMLElement'] = None
+        self._doc: Optional[_Document] = None
+        """ rendered html of the element keyed by indentation, dropped when the element or a sub-element changes """
+        self._cache: Optional[Dict[int, str]] = None
+        """ serialized opening tag and text of the element, dropped when they change """
+        self._open: Optional[str] = None
+        """ merkle digest of the element and its sub-elements, dropped when the element or a sub-element changes """
+        self._hash: Optional[bytes] = None
         HTMLElement.append(self, value)
-       
+
+    @property
+    def name(self) -> str:
+        """ tag name of the element """
+        return self._name
+
+    @name.setter
+    def name(self, name: str) -> None:
+        if name not in HTMLElement.VALID_TAGS:
+            raise Exception(f'{name} not vaild name of tag in the HTML')
+        name = sys.intern(name)
+        journal = self._journal()
+        if journal is not None:
+            journal.append(('name', self, self._name))
+        index = self._index()
+        if index is not None:
+            index.ranked.clear()
+            index._discard(index.tags, self._name, self)
+            index.tags.setdefault(name, {})[self] = None
+        self._name = name
+        self._open = None
+        self._invalidate()
+
+    @property
+    def value(self) -> List[Union[str, 'HTMLElement']]:
+        """ the text of the element followed by its sub-elements, append and remove on it change the element """
+        return _ValueList(self)
+
+    @value.setter
+    def value(self, value: HTMLElementValue) -> None:
+        HTMLElement.detach_all(list(self.iter_children()))
+        self.text = None
+        HTMLElement.append(self, value)
+
+    @property
+    def text(self) -> Optional[str]:
+        """ the text of the element, None when it has no text """
+        return self._text
+
+    @text.setter
+    def text(self, text: Optional[str]) -> None:
+        journal = self._journal()
+        if journal is not None:
+            journal.append(('text', self, self._text))
+        self._text = text
+        self._open = None
+        self._invalidate()
+
+    @property
+    def children(self) -> List['HTMLElement']:
+        """ the sub-elements of the element """
+        return list(self.iter_children())
+
+    def iter_children(self) -> Iterator['HTMLElement']:
+        """ yield the sub-elements of the element by following the sibling links """
+        child = self._first
+        while child is not None:
+            yield child
+            child = child._next
+
+    @property
+    def next_sibling(self) -> Optional['HTMLElement']:
+        return self._next
+
+    @property
+    def previous_sibling(self) -> Optional['HTMLElement']:
+        return self._prev
+
+    @property
+    def attrs(self) -> _AttrMap:
+        """ attributes of the element, changing the id keeps the id registry up to date """
+        return _AttrMap(self)
+
+    @attrs.setter
+    def attrs(self, attrs: dict) -> None:
+        for key in list(self._attrs):
+            self._del_attr(key)
+        for key, value in attrs.items():
+            self._set_attr(key, value)
+
+    @property
+    def ids(self) -> Set[str]:
+        """ ids of the element and its sub-elements """
+        if self.parent is None:
+            return set(self._document().ids)
+        return {node._attrs['id'] for node in HTMLElement.iter_preorder(self) if 'id' in node._attrs}
+
+    @property
+    def root(self) -> 'HTMLElement':
+        """ the top element of the tree this element belongs to """
+        node = self
+        while node.parent is not None:
+            node = node.parent
+        return node
+
+    def _document(self) -> _Document:
+        """ the registry of the tree, a standalone element gets its own on first use """
+        doc = self._doc
+        if doc is None:
+            doc = self._doc = _Document()
+            if 'id' in self._attrs:
+                doc.ids[self._attrs['id']] = self
+            return doc
+        if doc.forward is None:
+            return doc
+        top = doc
+        while top.forward is not None:
+            top = top.forward
+        while doc.forward is not top and doc.forward is not None:
+            doc.forward, doc = top, doc.forward
+        self._doc = top
+        return top
+
+    def _index(self) -> Optional[_Index]:
+        """ the indexes of the tree, None while a batch defers their updates so queries scan the tree """
+        if self._doc is None:
+            return None
+        doc = self._document()
+        return doc.index if doc.batch is None else None
+
+    def _journal(self) -> Optional[Journal]:
+        return self._document().batch if self._doc is not None else None
+
+    def _invalidate(self) -> None:
+        """ 
+        drop the render cache and the digest of the element and its ancestors, both are made from the sub-elements
+        so the walk stops at the first element holding neither
+        """
+        node: Optional['HTMLElement'] = self
+        while node is not None and (node._cache is not None or node._hash is not None):
+            node._cache = None
+            node._hash = None
+            node = node.parent
+
+    @classmethod
+    def _digest(cls, element: 'HTMLElement') -> bytes:
+        """ the merkle digest of the element, computed for the sub-elements missing one, b'' below a lazy element """
+        if element._hash is None:
+            for node, _, entering in cls.walk(element, prune=_hashed):
+                if entering or node._hash is not None:
+                    continue
+                if node.__class__ is LazyElement:
+                    node._hash = b''
+                    continue
+                tag_open = node._open
+                if tag_open is None:
+                    tag_open = node._open = _open_tag(node._name, node._attrs.items(), node._text or '')
+                header = tag_open.encode('utf-8')
+                digest = blake2b(b'\x01' if node._text is None else b'\x00', digest_size=16)
+                digest.update(len(header).to_bytes(4, 'little'))
+                digest.update(header)
+                child = node._first
+                while child is not None and child._hash:
+                    digest.update(child._hash)
+                    child = child._next
+                node._hash = b'' if child is not None else digest.digest()
+        return element._hash  # type: ignore[return-value]
+
+    def digest(self) -> bytes:
+        """ 
+        structural digest of the element: tag, text, attrs and the digests of its sub-elements, 
+        equal trees have equal digests and it is computed once until the tree changes
+        """
+        digest = HTMLElement._digest(self)
+        if not digest:
+            raise ValueError('a tree with lazy elements has no digest')
+        return digest
+
+    @classmethod
+    def tree_equal(cls, element: 'HTMLElement', other: 'HTMLElement') -> bool:
+        """ check if the two trees render the same html, in O(1) once their digests are known """
+        return element is other or element.digest() == other.digest()
+
+    @classmethod
+    def etag(cls, root: 'HTMLElement', space: int = 0) -> str:
+        """ a strong ETag of the html rendered by render(root, space), without rendering it """
+        suffix = f'-{space}' if space else ''
+        return f'"{root.digest().hex()}{suffix}"'
+
+    def _set_attr(self, key: str, value: str) -> None:
+        self._open = None
+        self._invalidate()
+        if self._attrs.__class__ is _SharedAttrs:
+            self._attrs = dict(self._attrs)
+        key = sys.intern(key)
+        if self._doc is None:
+            self._attrs[key] = value
+            return
+        doc = self._document()
+        if doc.batch is not None:
+            doc.batch.append(('attr', self, key, self._attrs.get(key)))
+        if key == 'id':
+            owner = doc.ids.get(value)
+            if owner is not None and owner is not self:
+                raise Exception('Duplicate ID, Faild to append')
+            if 'id' in self._attrs:
+                doc.ids.pop(self._attrs['id'], None)
+            doc.ids[value] = self
+        if doc.index is not None and doc.batch is None:
+            if key in self._attrs:
+                doc.index.discard_attr(self, key, self._attrs[key])
+            doc.index.add_attr(self, key, value)
+        self._attrs[key] = value
+
+    def _del_attr(self, key: str) -> None:
+        self._open = None
+        self._invalidate()
+        if self._attrs.__class__ is _SharedAttrs:
+            self._attrs = dict(self._attrs)
+        value = self._attrs.pop(key)
+        if self._doc is None:
+            return
+        doc = self._document()
+        if doc.batch is not None:
+            doc.batch.append(('attr', self, key, value))
+        if key == 'id':
+            doc.ids.pop(value, None)
+        if doc.index is not None and doc.batch is None:
+            doc.index.discard_attr(self, key, value)
+
+    @classmethod
+    def _new(cls, name: str, attrs: Dict[str, str], text: Optional[str]) -> 'HTMLElement':
+        """ make an element without validation or bookkeeping, bulk builders set up the registry themselves """
+        element = cls.__new__(cls)
+        element._name = name
+        element._attrs = attrs
+        element._text = text
+        element.parent = element._first = element._last = element._prev = element._next = None
+        element._doc = None
+        element._cache = None
+        element._open = None
+        element._hash = None
+        return element
+
+    @staticmethod
+    def _link(parent: 'HTMLElement', child: 'HTMLElement') -> None:
+        """ add child as the last sub-element of parent, without any bookkeeping """
+        child.parent = parent
+        last = parent._last
+        if last is None:
+            parent._first = child
+        else:
+            last._next = child
+            child._prev = last
+        parent._last = child
+
+    @staticmethod
+    def _unlink(parent: 'HTMLElement', child: 'HTMLElement') -> None:
+        """ take child out of the sub-elements of parent, without any bookkeeping """
+        if child._prev is None:
+            parent._first = child._next
+        else:
+            child._prev._next = child._next
+        if child._next is None:
+            parent._last = child._prev
+        else:
+            child._next._prev = child._prev
+        child.parent = child._prev = child._next = None
+
+    @staticmethod
+    def _link_after(parent: 'HTMLElement', child: 'HTMLElement', prev: Optional['HTMLElement']) -> None:
+        """ add child right after the sub-element prev of parent (first when prev is None), without any bookkeeping """
+        after = parent._first if prev is None else prev._next
+        child.parent = parent
+        child._prev = prev
+        child._next = after
+        if prev is None:
+            parent._first = child
+        else:
+            prev._next = child
+        if after is None:
+            parent._last = child
+        else:
+            after._prev = child
+
+    @classmethod
+    def insert(cls, parent: 'HTMLElement', position: int, child: 'HTMLElement') -> None:
+        """ 
+        insert child as the sub-element number position of parent (appended when position is past the end),
+        a sub-element of parent is moved without touching the bookkeeping of its sub tree
+        """
+        before = parent._first
+        count = 0
+        while before is not None:
+            if before is not child:
+                if count == position:
+                    break
+                count += 1
+            before = before._next
+        cls.insert_before(parent, child, before)
+
+    @classmethod
+    def insert_before(cls, parent: 'HTMLElement', child: 'HTMLElement', before: Optional['HTMLElement']) -> None:
+        """ 
+        insert child right before the sub-element before of parent (appended when before is None) in O(1),
+        a sub-element of parent is moved without touching the bookkeeping of its sub tree
+        """
+        if before is child:
+            return
+        if before is not None and before.parent is not parent:
+            raise ValueError('before is not a sub-element of parent')
+        moved = child.parent is parent
+        journal = parent._journal()
+        if moved:
+            parent._invalidate()
+            if journal is not None:
+                journal.append(('unlink', parent, child, child._prev))
+                journal.append(('link', parent, child))
+        else:
+            cls.append(parent, child)
+        cls._unlink(parent, child)
+        if before is None:
+            cls._link(parent, child)
+        else:
+            child.parent = parent
+            child._next = before
+            child._prev = before._prev
+            if before._prev is None:
+                parent._first = child
+            else:
+                before._prev._next = child
+            before._prev = child
+        index = parent._document().index
+        if index is not None and (moved or before is not None):
+            index.renumber()
+
     @classmethod
     def append(cls, parent: 'HTMLElement', child: HTMLElementValue) -> None: 
         """ Append instance of Element or sub tree to tree """
         if isinstance(child, str):
-            parent.value = [child]
+            journal = parent._journal()
+            if journal is not None:
+                journal.append(('text', parent, parent._text))
+            parent._text = child if parent._text is None else parent._text + child
+            parent._open = None
+            parent._invalidate()
         elif isinstance(child,list):
             for ch in child:
                 cls.append(parent,ch)
         elif isinstance(child,HTMLElement): 
-            if 'id' in child.attrs:
-                for id in child.ids:
-                    if parent.check_update_id(id): 
-                        raise Exception('Duplicate ID, Faild to append')
-            child.parent = parent
-            parent.value.append(child)
-            
-            """ or using update:  parent.ids.update(child.ids)  """ 
-            parent.ids = parent.ids.union(child.ids)
-            
-    def check_update_id(self, id: str) -> bool: 
+            if child is parent or (child._doc is not None and parent._doc is not None and cls._contains(child, parent)):
+                raise Exception('Cannot append an element to its own sub tree')
+            if child.parent is not None:
+                child.detach()
+            doc = parent._document()
+            if doc.batch is not None:
+                """ the ids, the indexes and the caches are brought up to date when the batch ends """
+                if child._doc is None:
+                    child._doc = doc
+                elif child._document() is not doc:
+                    child._document().forward = doc
+                cls._link(parent, child)
+                doc.batch.append(('link', parent, child))
+                return
+            index = doc.index
+            at_end = index is not None and index.at_end(parent)
+            if child._doc is None:
+                child_ids = {child._attrs['id']: child} if 'id' in child._attrs else {}
+            else:
+                child_ids = child._document().ids
+            if not doc.ids.keys().isdisjoint(child_ids):
+                raise Exception('Duplicate ID, Faild to append')
+            if child._doc is not None and len(child_ids) > len(doc.ids):
+                """ merge the smaller registry into the larger one """
+                child_doc = child._document()
+                child_doc.ids.update(doc.ids)
+                doc.forward = child_doc
+                doc = child_doc
+            else:
+                doc.ids.update(child_ids)
+                if child._doc is not None:
+                    child._document().forward = doc
+            doc.index = index
+            child._doc = doc
+            cls._link(parent, child)
+            parent._invalidate()
+            if index is not None:
+                for node in cls.iter_preorder(child):
+                    index.add(node)
+                if at_end:
+                    index.number(child)
+                else:
+                    index.renumber()
+        elif child is not None:
+            raise TypeError(f'{type(child).__name__} can not be a value of HTMLElement')
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
         """ 
-        check if the id of element or ids of subtree found in tree 
-        then add the id to set of ids
+        defer the id checks, the index updates and the cache invalidation of the changes made to the tree
+        in the block to a single pass when it ends, if an id is duplicated or the block raises
+        every change of the block is undone, elements taken from another tree are left detached
         """
-        if id is None:                              
+        doc = self._document()
+        if doc.batch is not None:
+            yield
+            return
+        journal: Journal = []
+        doc.batch = journal
+        try:
+            yield
+            doc.batch = None
+            HTMLElement._register(self.root, doc)
+        except BaseException:
+            doc.batch = None
+            HTMLElement._rollback(self.root, doc, journal)
+            raise
+        HTMLElement._invalidate_all(journal)
+
+    @classmethod
+    def _register(cls, root: 'HTMLElement', doc: _Document) -> None:
+        """ point every element of the tree of root to doc and rebuild its id registry and index in one pass """
+        ids: Dict[str, HTMLElement] = {}
+        index = _Index() if doc.index is not None else None
+        for node in cls.iter_preorder(root):
+            node._doc = doc
+            if 'id' in node._attrs:
+                if node._attrs['id'] in ids:
+                    raise Exception('Duplicate ID, Faild to append')
+                ids[node._attrs['id']] = node
+            if index is not None:
+                index.add(node)
+        doc.ids = ids
+        if index is not None:
+            index.number(root)
+            doc.index = index
+
+    @classmethod
+    def _rollback(cls, root: 'HTMLElement', doc: _Document, journal: Journal) -> None:
+        """ undo the changes of a batch from the last one, then rebuild the bookkeeping of the trees they touched """
+        detached = []
+        for change in reversed(journal):
+            kind, element = change[0], change[1]
+            if kind == 'link':
+                cls._unlink(element, change[2])
+                detached.append(change[2])
+            elif kind == 'unlink':
+                cls._link_after(element, change[2], change[3])
+            elif kind == 'text':
+                element._text = change[2]
+                element._open = None
+            elif kind == 'name':
+                element._name = change[2]
+                element._open = None
+            else:
+                if element._attrs.__class__ is _SharedAttrs:
+                    element._attrs = dict(element._attrs)
+                if change[3] is None:
+                    element._attrs.pop(change[2], None)
+                else:
+                    element._attrs[change[2]] = change[3]
+                element._open = None
+        cls._register(root, doc)
+        for element in detached:
+            if element.parent is None:
+                cls._register(element, _Document())
+        cls._invalidate_all(journal)
+
+    @staticmethod
+    def _invalidate_all(journal: Journal) -> None:
+        """ 
+        drop the caches of the elements changed in a batch and of all their ancestors, a render in the
+        batch could have cached an ancestor above an element without cache so the walks do not stop early
+        """
+        seen: Set[HTMLElement] = set()
+        for change in journal:
+            node: Optional[HTMLElement] = change[1]
+            while node is not None and node not in seen:
+                seen.add(node)
+                node._cache = None
+                node._hash = None
+                node = node.parent
+
+    @classmethod
+    def is_ancestor(cls, ancestor: 'HTMLElement', element: 'HTMLElement') -> bool:
+        """ 
+        check if element is ancestor or one of its sub-elements, in O(1) from the document positions
+        of an indexed tree (renumbered first when a change made them stale), else along the parent links
+        """
+        index = element._index()
+        if index is not None and index.order is None and ancestor._document() is element._document():
+            index.ordered(element.root)
+        return cls._contains(ancestor, element)
+
+    @classmethod
+    def _contains(cls, ancestor: 'HTMLElement', element: 'HTMLElement') -> bool:
+        """ 
+        is_ancestor without renumbering, the parent links are followed while the positions are stale
+        or a batch appends elements without positions
+        """
+        doc = element._document()
+        if ancestor._document() is not doc:
             return False
-        if id in self.ids:
-            self.ids.remove(id) 
-            return True
-        temp: Optional['HTMLElement'] = self.parent
-        if temp:
-            return temp.check_update_id(id)
-        self.ids.add(id) 
-        if self.parent:
-            self.parent.ids.add(id)
+        index = doc.index
+        if index is not None and index.order is not None and doc.batch is None:
+            order = index.order
+            return order[ancestor] <= order[element] <= index.ends[ancestor]
+        node: Optional['HTMLElement'] = element
+        while node is not None:
+            if node is ancestor:
+                return True
+            node = node.parent
         return False
 
+    def check_update_id(self, id: str) -> bool: 
+        """ check if the id is already used by an element of the tree """
+        if id is None:                              
+            return False
+        return id in self._document().ids
 
     @classmethod
-    def render(cls, element:'HTMLElement', space:int=0) -> str:
-        """  render the html element and its own sub-elements as specif format """
+    def get_element_by_id(cls, root: 'HTMLElement', id: str) -> Optional['HTMLElement']:
+        """ 
+        find the element with the id in the tree of root from the id registry, in O(1) from the top of the tree,
+        a lookup scoped to a sub tree checks the ancestors of the element found
+        """
+        element = root._document().ids.get(id)
+        if root.parent is None:
+            return element
+        node = element
+        while node is not None and node is not root:
+            node = node.parent
+        return element if node is root else None
+
+    @classmethod
+    def walk(cls, root: 'HTMLElement', prune: Prune = None) -> Iterator[Tuple['HTMLElement', int, bool]]:
+        """ 
+        walk the tree along the parent and sibling links, yield (element, depth, entering) when an element
+        is entered and again when it is left, prune(element) returning True skips its sub-elements
+        """
+        node, depth = root, 0
+        yield node, depth, True
+        while True:
+            child = node._first
+            if child is not None and (prune is None or not prune(node)):
+                node, depth = child, depth + 1
+                yield node, depth, True
+                continue
+            while True:
+                yield node, depth, False
+                sibling, parent = node._next, node.parent
+                if node is root or parent is None:
+                    return
+                if sibling is not None:
+                    node = sibling
+                    yield node, depth, True
+                    break
+                node, depth = parent, depth - 1
+
+    @classmethod
+    def iter_preorder(cls, root: 'HTMLElement', prune: Prune = None) -> Iterator['HTMLElement']:
+        """ yield the element and its sub-elements in document order """
+        node = root
+        while True:
+            yield node
+            child = node._first
+            if child is not None and (prune is None or not prune(node)):
+                node = child
+                continue
+            while True:
+                sibling, parent = node._next, node.parent
+                if node is root or parent is None:
+                    return
+                if sibling is not None:
+                    node = sibling
+                    break
+                node = parent
+
+    @classmethod
+    def iter_postorder(cls, root: 'HTMLElement', prune: Prune = None) -> Iterator['HTMLElement']:
+        """ yield every sub-element before its parent """
+        for node, _, entering in cls.walk(root, prune):
+            if not entering:
+                yield node
+
+    @classmethod
+    def iter_breadth_first(cls, root: 'HTMLElement', prune: Prune = None) -> Iterator['HTMLElement']:
+        """ yield the elements level by level """
+        queue = deque((root,))
+        while queue:
+            node = queue.popleft()
+            yield node
+            if prune is None or not prune(node):
+                queue.extend(node.iter_children())
+
+    @classmethod
+    def iter_render(
+        cls, element: 'HTMLElement', space: int = 0, cache: bool = False, minify: bool = False,
+    ) -> Iterator[str]:
+        """ 
+        yield the rendered html of the element and its sub-elements chunk by chunk in document order,
+        with cache=True every element keeps its rendered html and unchanged sub trees are reused,
+        with minify=True no indent nor newline is written (space and cache are not used)
+        """
         if element is None:
-            return 'the element empty'
-        indent = " " * space
-        attribute = ' '.join(f'{key}="{val}"' for key, val in element.attrs.items())
-        tag_open = f'<{element.name} {attribute.strip()}>' if attribute else f'<{element.name}>'
-        tag_close = f'</{element.name}>'
-        string_child = '\n'.join(cls.render(ch,space + 4) for ch in element.value if isinstance(ch, HTMLElement))
-        val = ''.join(str(v) for v in element.value if isinstance(v, str))
-        return f'{indent}{tag_open}{val}\n{string_child}{indent}{tag_close}\n'
+            yield 'the element empty'
+            return
+        if minify:
+            yield from cls._iter_minified(element)
+            return
+        if cache:
+            yield cls._render_cached(element, space)
+            return
+        sibling_closed = False
+        for node, depth, entering in cls.walk(element):
+            if entering:
+                if sibling_closed:
+                    yield '\n'
+                    sibling_closed = False
+                yield cls._render_open(node, space + 4 * depth)
+            else:
+                if node.__class__ is LazyElement:
+                    yield from cls._render_rows(node, space + 4 * (depth + 1))
+                yield f'{" " * (space + 4 * depth)}</{node._name}>\n'
+                sibling_closed = True
+
+    @classmethod
+    def _iter_minified(cls, element: 'HTMLElement') -> Iterator[str]:
+        for node, _, entering in cls.walk(element):
+            if entering:
+                yield cls._render_open(node)
+            else:
+                if node.__class__ is LazyElement:
+                    yield from cls._render_rows(node, 0, minify=True)
+                yield f'</{node._name}>'
+
+    @classmethod
+    def _render_rows(cls, element: 'HTMLElement', space: int, minify: bool = False) -> Iterator[str]:
+        """ render the rows of a lazy element one at a time, their ids must be new to the tree and to each other """
+        if not isinstance(element, LazyElement):
+            return
+        ids = element._document().ids
+        seen: Set[str] = set()
+        separate = element._first is not None and not minify
+        for row in element.iter_rows():
+            if separate:
+                yield '\n'
+            separate = not minify
+            for node in cls.iter_preorder(row):
+                if 'id' in node._attrs:
+                    id = node._attrs['id']
+                    if id in ids or id in seen:
+                        raise Exception(f'Duplicate ID {id}, Faild to render')
+                    seen.add(id)
+            yield ''.join(cls.iter_render(row, space, minify=minify))
+
+    @staticmethod
+    def _render_open(element: 'HTMLElement', space: Optional[int] = None) -> str:
+        """ 
+        render the opening tag and the text of the element, serialized once until they change,
+        without indent nor newline when space is None
+        """
+        tag_open = element._open
+        if tag_open is None:
+            tag_open = element._open = _open_tag(element._name, element._attrs.items(), element._text or '')
+        if space is None:
+            return tag_open
+        return f'{" " * space}{tag_open}\n'
+
+    @classmethod
+    def _render_cached(cls, element: 'HTMLElement', space: int) -> str:
+        """ render reusing the cached html of unchanged sub trees, parts[-1] collects the element being rendered """
+        stats = cls.RENDER_CACHE_STATS
+        parts: List[List[str]] = [[]]
+        """ parts below volatile belong to ancestors of lazy elements, their html is not kept """
+        volatile = 1
+        node, depth = element, 0
+        while True:
+            indent = space + 4 * depth
+            if node is not element and node._prev is not None:
+                parts[-1].append('\n')
+            cached = node._cache.get(indent) if node._cache is not None else None
+            if cached is not None:
+                stats['hits'] += 1
+                parts[-1].append(cached)
+            elif (
+                node._hash is not None and node._first is not None
+                and (renders := node._document().renders) is not None
+                and (shared := renders.get((node._hash, indent))) is not None
+            ):
+                """ an identical sub tree was rendered before, looked up only when the digest is known already """
+                stats['hits'] += 1
+                node._cache = {indent: shared}
+                parts[-1].append(shared)
+            else:
+                stats['misses'] += 1
+                parts.append([cls._render_open(node, indent)])
+                if node._first is not None:
+                    node, depth = node._first, depth + 1
+                    continue
+                volatile = cls._store_cached(node, indent, parts, volatile)
+            while True:
+                sibling, parent = node._next, node.parent
+                if node is element or parent is None:
+                    return ''.join(parts[0])
+                if sibling is not None:
+                    node = sibling
+                    break
+                node, depth = parent, depth - 1
+                volatile = cls._store_cached(node, space + 4 * depth, parts, volatile)
+
+    @classmethod
+    def _store_cached(cls, element: 'HTMLElement', indent: int, parts: List[List[str]], volatile: int) -> int:
+        level = len(parts) - 1
+        element_parts = parts.pop()
+        if element.__class__ is LazyElement:
+            element_parts.extend(cls._render_rows(element, indent + 4))
+            volatile = level + 1
+        element_parts.append(f'{" " * indent}</{element._name}>\n')
+        html = ''.join(element_parts)
+        if level < volatile:
+            volatile = level
+        else:
+            if element._cache is None:
+                element._cache = {}
+            element._cache[indent] = html
+            if element._hash and element._first is not None and element.parent is not None:
+                doc = element._document()
+                if doc.renders is None:
+                    doc.renders = {}
+                elif len(doc.renders) >= SHARED_RENDERS_SIZE:
+                    del doc.renders[next(iter(doc.renders))]
+                doc.renders[(element._hash, indent)] = html
+        parts[-1].append(html)
+        return volatile
+
+    @classmethod
+    def clear_render_cache(cls, root: 'HTMLElement') -> None:
+        """ drop the cached html of the element and its sub-elements, the ancestors drop the html holding it """
+        root._invalidate()
+        ancestor = root.parent
+        while ancestor is not None:
+            ancestor._cache = None
+            ancestor = ancestor.parent
+        for node in cls.iter_preorder(root):
+            node._cache = None
+            node._open = None
+
+    @classmethod
+    def render(cls, element: 'HTMLElement', space: int = 0, cache: bool = False, minify: bool = False) -> str:
+        """  render the html element and its own sub-elements as specif format """
+        return ''.join(cls.iter_render(element, space, cache, minify))
+
+    @classmethod
+    def _iter_buffered(cls, element: 'HTMLElement', space: int, cache: bool, minify: bool) -> Iterator[str]:
+        """ the chunks of iter_render joined in pieces of about RENDER_BUFFER_SIZE characters """
+        buffer: List[str] = []
+        size = 0
+        for chunk in cls.iter_render(element, space, cache, minify):
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= RENDER_BUFFER_SIZE:
+                yield ''.join(buffer)
+                buffer.clear()
+                size = 0
+        if buffer:
+            yield ''.join(buffer)
+
+    @classmethod
+    def render_to(
+        cls, element: 'HTMLElement', stream: IO[str], space: int = 0, cache: bool = False, minify: bool = False,
+    ) -> None:
+        """ write the rendered html to any file-like object without building the whole string """
+        for piece in cls._iter_buffered(element, space, cache, minify):
+            stream.write(piece)
+
+    @classmethod
+    def iter_compressed(
+        cls, element: 'HTMLElement', method: str = 'gzip', space: int = 0, minify: bool = False,
+        level: int = 6, encoding: str = 'utf-8',
+    ) -> Iterator[bytes]:
+        """ 
+        yield the rendered html compressed with gzip or deflate as it is rendered, neither the html
+        nor the compressed document is ever whole in memory, the chunks can go out as a streamed http body
+        """
+        if method not in COMPRESSION_WBITS:
+            raise ValueError(f'{method} not a supported compression, use one of {sorted(COMPRESSION_WBITS)}')
+        compressor = zlib.compressobj(level, zlib.DEFLATED, COMPRESSION_WBITS[method])
+        for piece in cls._iter_buffered(element, space, False, minify):
+            data = compressor.compress(piece.encode(encoding))
+            if data:
+                yield data
+        yield compressor.flush()
+
+    @classmethod
+    def render_compressed(
+        cls, element: 'HTMLElement', stream: IO[bytes], method: str = 'gzip', space: int = 0,
+        minify: bool = False, level: int = 6,
+    ) -> None:
+        """ write the rendered html compressed with gzip or deflate to a binary file-like object """
+        for data in cls.iter_compressed(element, method, space, minify, level):
+            stream.write(data)
+
+    @classmethod
+    async def aiter_render(
+        cls, element: 'HTMLElement', space: int = 0, every: int = ASYNC_RENDER_SLICE,
+    ) -> AsyncIterator[str]:
+        """ 
+        yield the rendered html in chunks of about every elements and give the event loop a turn after each,
+        the first chunk comes after every elements whatever the size of the tree
+        """
+        buffer: List[str] = []
+        """ iter_render yields about two chunks for every element """
+        limit = 2 * every
+        for chunk in cls.iter_render(element, space):
+            buffer.append(chunk)
+            if len(buffer) >= limit:
+                yield ''.join(buffer)
+                buffer.clear()
+                await asyncio.sleep(0)
+        if buffer:
+            yield ''.join(buffer)
+
+    @classmethod
+    async def arender(
+        cls, element: 'HTMLElement', writer: asyncio.StreamWriter, space: int = 0,
+        every: int = ASYNC_RENDER_SLICE, encoding: str = 'utf-8',
+    ) -> None:
+        """ write the rendered html to an asyncio stream writer without blocking the event loop for long """
+        async for chunk in cls.aiter_render(element, space, every):
+            writer.write(chunk.encode(encoding))
+            await writer.drain()
+
+    @classmethod
+    def create_index(cls, root: 'HTMLElement') -> None:
+        """ 
+        index the tree of root by tag name, attribute value and class token,
+        append, remove and attribute changes keep the indexes up to date
+        """
+        doc = root._document()
+        if doc.index is None:
+            index = _Index()
+            for node in cls.iter_preorder(root.root):
+                index.add(node)
+            index.number(root.root)
+            doc.index = index
+
+    @classmethod
+    def drop_index(cls, root: 'HTMLElement') -> None:
+        """ stop maintaining the indexes of the tree of root """
+        root._document().index = None
+
+    @classmethod
+    def _from_index(cls, html_element: 'HTMLElement', index: _Index, bucket: Optional[Bucket]) -> List['HTMLElement']:
+        """ the elements of an index bucket inside html_element, in document order """
+        if not bucket:
+            return []
+        order = index.order if index.order is not None else index.ordered(html_element.root)
+        positions, elements = index.ranked_bucket(bucket)
+        if html_element.parent is None:
+            return list(elements)
+        return elements[bisect_left(positions, order[html_element]):bisect_right(positions, index.ends[html_element])]
 
     @classmethod
     def find_element_by_tag_name(cls, html_element: 'HTMLElement', name: str) -> List['HTMLElement']:
         """ find element by tage name """
-        results = []
-        if html_element.name == name:
-            results.append(html_element)        
-        for child in html_element.value:
-            if isinstance(child, HTMLElement):
-                results.extend(cls.find_element_by_tag_name(child, name))
-        return results
+        index = html_element._index()
+        if index is not None:
+            return cls._from_index(html_element, index, index.tags.get(name))
+        return [node for node in cls.iter_preorder(html_element) if node._name == name]
 
     @classmethod
     def find_element_by_attrs(cls, html_element: 'HTMLElement', attr: str, value: str) -> List['HTMLElement']:
         """ find element by attrs """
-        results = []
-        if html_element.attrs.get(attr) == value:
-            results.append(html_element)
-        for child in html_element.value:
-            if isinstance(child, HTMLElement):
-                results.extend(cls.find_element_by_attrs(child, attr, value))
-        return results
+        index = html_element._index()
+        if index is not None:
+            return cls._from_index(html_element, index, index.attrs.get((attr, value)))
+        return [node for node in cls.iter_preorder(html_element) if node._attrs.get(attr) == value]
 
     @classmethod
-    def render_html_file(cls, root:'HTMLElement') -> str:
-        """ render html to file, have the DOCTYPE """
-        result_html = "<!DOCTYPE html>\n<html>\n"
-        result_html += cls.render(root, space=4)
-        result_html += "</html>\n"
-        with open("index.html", "w") as file_html:
-            file_html.write(result_html)
-        return result_html
+    def find_element_by_class(cls, html_element: 'HTMLElement', class_name: str) -> List['HTMLElement']:
+        """ find the elements that have class_name in their class attribute """
+        index = html_element._index()
+        if index is not None:
+            return cls._from_index(html_element, index, index.classes.get(class_name))
+        return [
+            node for node in cls.iter_preorder(html_element)
+            if class_name in node._attrs.get('class', '').split()
+        ]
+
+    @classmethod
+    def compile(cls, root: 'HTMLElement', space: int = 0, escape: bool = True) -> Template:
+        """ 
+        compile the tree of root into a Template, {name} in texts and attr values are placeholders
+        and {{ and }} literal braces (so {{name}} renders as {name}),
+        the tree is rendered once and later changes to it do not affect the template
+        """
+        if root is None:
+            raise ValueError('the element empty')
+        return Template(cls.render(root, space), escape)
+
+    @classmethod
+    def render_html_file(
+        cls, root: 'HTMLElement', path_or_fileobj: Union[str, 'os.PathLike[str]', IO[str]] = 'index.html'
+    ) -> None:
+        """ stream the html with the DOCTYPE to a file path or an open file object """
+        if isinstance(path_or_fileobj, (str, os.PathLike)):
+            with open(path_or_fileobj, 'w') as file_html:
+                cls._write_html_file(root, file_html)
+        else:
+            cls._write_html_file(root, path_or_fileobj)
+
+    @classmethod
+    def _write_html_file(cls, root: 'HTMLElement', file_html: IO[str]) -> None:
+        file_html.write("<!DOCTYPE html>\n<html>\n")
+        cls.render_to(root, file_html, space=4)
+        file_html.write("</html>\n")
 
     @classmethod
     def remove(cls, root: 'HTMLElement', subtree_to_remove: 'HTMLElement') -> Union['HTMLElement', None]:
@@ -113,61 +1352,328 @@ class HTMLElement:
         remove the element or sub tree from tree and remove any ids of sub tree
         like seperate it to two tree 
         """
-        if root.value is None:
+        if subtree_to_remove is root or not cls._contains(root, subtree_to_remove):
             return None
-        if subtree_to_remove in root.value:              
-            root.ids.difference_update(subtree_to_remove.ids)
-            root.value.remove(subtree_to_remove)
-            return  subtree_to_remove
-        for ch in root.value:
-            if isinstance(ch, HTMLElement):
-                res = cls.remove(ch, subtree_to_remove)
-                if res:
-                    root.ids.difference_update(subtree_to_remove.ids)
-                    return res
-        return None
+        return subtree_to_remove.detach()
+
+    def detach(self) -> 'HTMLElement':
+        """ 
+        unlink the element from its parent, the element becomes the root of its own tree
+        and takes the ids of its sub tree with it
+        """
+        if self.parent is not None:
+            HTMLElement.detach_all([self])
+        return self
+
+    @classmethod
+    def detach_all(cls, elements: List['HTMLElement']) -> None:
+        """ detach many elements, unlinking all of them first then moving their bookkeeping in one pass """
+        detached = []
+        for element in elements:
+            parent = element.parent
+            if parent is None:
+                continue
+            doc = element._document()
+            parent._invalidate()
+            if doc.batch is not None:
+                doc.batch.append(('unlink', parent, element, element._prev))
+            cls._unlink(parent, element)
+            detached.append((element, doc))
+        for element, doc in detached:
+            if element.parent is not None:
+                continue
+            ids = doc.ids
+            index = doc.index
+            subtree_doc = _Document()
+            for node in cls.iter_preorder(element):
+                node._doc = subtree_doc
+                if index is not None:
+                    index.discard(node)
+                if 'id' in node._attrs:
+                    ids.pop(node._attrs['id'], None)
+                    subtree_doc.ids[node._attrs['id']] = node
 
-    
-        
     @classmethod
-    def clone(cls, p: Optional['HTMLElement'] = None, element: Optional['HTMLElement'] = None) -> 'HTMLElement':
-        """ duplicate the tree with unique attrs"""
+    def clone(
+        cls, p: Optional['HTMLElement'] = None, element: Optional['HTMLElement'] = None, share: bool = False
+    ) -> 'HTMLElement':
+        """ 
+        duplicate the tree, every id gets the same _clone<n> suffix where n is the first number
+        that keeps all of them unique in the tree of p (or of element when p is None),
+        with share=True the elements without an id share their attrs with the original until one of them changes
+        """
         if element is None:
             raise ValueError('cant be none')
-        attr_clone = {}
-        for key, value in element.attrs.items():
-            attr_clone[key] = value + f'_clone{random.randint(1, 100)}'
-        child = [ch for ch in element.value if isinstance(ch, HTMLElement)]
-        value_of_str = ''.join(ch for ch in element.value if isinstance(ch, str))
-        element_clone = HTMLElement(element.name, child, attrs=attr_clone)
-        if value_of_str:
-            element_clone.value.append(value_of_str)
-            
-        for ch in child:
-            child_clone = cls.clone(element_clone, ch)
-            HTMLElement.append(element_clone, child_clone)
-        return element_clone
+        taken = (p if p is not None else element)._document()
+        ids = [node._attrs['id'] for node in cls.iter_preorder(element) if 'id' in node._attrs]
+        seq = taken.clone_seq + 1
+        while ids and any(f'{id}_clone{seq}' in taken.ids for id in ids):
+            seq += 1
+        if ids:
+            taken.clone_seq = seq
+        doc = _Document()
+        suffix = f'_clone{seq}'
+        with _gc_paused():
+            new = cls.__new__
+            node = element
+            parent_clone: Optional['HTMLElement'] = None
+            while True:
+                attrs = node._attrs
+                if 'id' in attrs:
+                    attrs = dict(attrs)
+                    attrs['id'] += suffix
+                elif share:
+                    if attrs.__class__ is not _SharedAttrs:
+                        attrs = node._attrs = _SharedAttrs(attrs)
+                elif attrs:
+                    attrs = dict(attrs)
+                element_clone = new(node.__class__)
+                if isinstance(node, LazyElement) and isinstance(element_clone, LazyElement):
+                    element_clone._rows, element_clone._count = node._rows, node._count
+                element_clone._name = node._name
+                element_clone._attrs = attrs
+                element_clone._text = node._text
+                element_clone._first = element_clone._last = element_clone._next = None
+                element_clone._doc = doc
+                element_clone._cache = None
+                element_clone._open = None
+                element_clone._hash = None
+                if 'id' in attrs:
+                    doc.ids[attrs['id']] = element_clone
+                element_clone.parent = parent_clone
+                if parent_clone is None:
+                    root_clone = element_clone
+                    element_clone._prev = None
+                else:
+                    last = element_clone._prev = parent_clone._last
+                    if last is None:
+                        parent_clone._first = element_clone
+                    else:
+                        last._next = element_clone
+                    parent_clone._last = element_clone
+                if node._first is not None:
+                    parent_clone, node = element_clone, node._first
+                    continue
+                while True:
+                    sibling, parent = node._next, node.parent
+                    if node is element or parent is None or parent_clone is None:
+                        return root_clone
+                    if sibling is not None:
+                        node = sibling
+                        break
+                    node, parent_clone = parent, parent_clone.parent
     
     
+    @classmethod
+    def parse(cls, text_or_stream: Union[str, IO[str], Iterable[str]]) -> 'HTMLElement':
+        """ 
+        build a tree from html text, an open text file or an iterable of text chunks,
+        the input is fed to the tokenizer chunk by chunk and the tree is built in one pass
+        """
+        builder = _TreeBuilder()
+        with _gc_paused():
+            if isinstance(text_or_stream, str):
+                builder.feed(text_or_stream)
+            elif hasattr(text_or_stream, 'read'):
+                read = text_or_stream.read
+                for chunk in iter(lambda: read(PARSE_CHUNK_SIZE), ''):
+                    builder.feed(chunk)
+            else:
+                for chunk in text_or_stream:
+                    builder.feed(chunk)
+            builder.close()
+        return builder.result()
+
     def to_dict(self) -> dict:
         """ convert html to json """
-        dict_html = {
-            "name": self.name,
-            "value": self.value if isinstance(self.value, str) else None,
-            "attrs": self.attrs,
-            "children": [
-                ch.to_dict() if isinstance(ch, HTMLElement) else ch
-                for ch in self.value
-                ]
-        }
+        dict_html: dict = {}
+        stack: List[dict] = []
+        for node, _, entering in HTMLElement.walk(self):
+            if not entering:
+                dict_html = stack.pop()
+                continue
+            node_dict: dict = {
+                "name": node._name,
+                "value": node._text,
+                "attrs": dict(node._attrs),
+                "children": [],
+            }
+            if stack:
+                stack[-1]["children"].append(node_dict)
+            stack.append(node_dict)
         return dict_html
     
     @classmethod   
     def from_dict(cls, element_json: dict) -> 'HTMLElement':  
-        """ convert json to html element or tree"""          
-        element = HTMLElement(element_json['name'], value=element_json['value'], attrs=element_json['attrs'])
-        for ch in element_json['children']:
-            child = HTMLElement(ch['name'],ch['value'],ch['attrs'])
-            cls.append(element,child)
+        """ 
+        convert json to html element or tree at any depth, strings in children are
+        taken as text like the output of older versions of to_dict and None children are skipped
+        """
+        end = object()
+        doc = _Document()
+        root = None
+        stack: List[Tuple[Optional['HTMLElement'], Iterator[Any]]] = [(None, iter((element_json,)))]
+        with _gc_paused():
+            while stack:
+                parent, items = stack[-1]
+                item = next(items, end)
+                if item is end:
+                    stack.pop()
+                    continue
+                if item is None:
+                    continue
+                if isinstance(item, str):
+                    if parent is not None:
+                        cls.append(parent, item)
+                    continue
+                if not isinstance(item, dict):
+                    raise TypeError(f'{type(item).__name__} can not be a child in element_json')
+                name = item['name']
+                if name not in cls.VALID_TAGS:
+                    raise Exception(f'{name} not vaild name of tag in the HTML')
+                attrs = item.get('attrs')
+                element = cls._new(
+                    sys.intern(name),
+                    {sys.intern(key): val for key, val in attrs.items()} if attrs else _NO_ATTRS,
+                    item.get('value') if isinstance(item.get('value'), str) else None,
+                )
+                element._doc = doc
+                if 'id' in element._attrs:
+                    if element._attrs['id'] in doc.ids:
+                        raise Exception('Duplicate ID, Faild to append')
+                    doc.ids[element._attrs['id']] = element
+                if parent is None:
+                    root = element
+                else:
+                    cls._link(parent, element)
+                stack.append((element, iter(item.get('children') or ())))
+        if root is None:
+            raise ValueError('element_json has no element')
+        return root
+
+    @classmethod
+    def diff(cls, old: 'HTMLElement', new: 'HTMLElement') -> List[dict]:
+        """ the operations turning the tree of old into the tree of new, see HTML.diff """
+        from HTML.diff import diff
+        return diff(old, new)
+
+    def __reduce__(self) -> Tuple[Callable[[bytes], 'HTMLElement'], Tuple[bytes]]:
+        """ 
+        pickle the element and its sub-elements in the binary format of HTML.binary, without recursion,
+        the element is loaded as the root of its own tree with the parent links and the id registry rebuilt
+        """
+        from HTML import binary
+        if any(node.__class__ is LazyElement for node in HTMLElement.iter_preorder(self)):
+            raise TypeError('a tree with lazy elements can not be pickled, its rows are only rendered')
+        return binary.loads, (binary.dumps(self),)
+
+    @classmethod
+    def profile(cls) -> ContextManager[Any]:
+        """ a context manager counting and timing the HTMLElement operations made in it, see HTML.profiling """
+        from HTML.profiling import profile
+        return profile()
+
+    @classmethod
+    def apply_patch(cls, root: 'HTMLElement', patch: List[dict]) -> 'HTMLElement':
+        """ apply the operations of diff to the tree of root in place and return its root """
+        from HTML.diff import apply_patch
+        return apply_patch(root, patch)
+
+
+Rows = Union[Iterable[HTMLElement], Callable[[], Iterable[HTMLElement]], Callable[[int], HTMLElement]]
+
+
+class LazyElement(HTMLElement):
+    """ 
+    element whose rows are made while it is rendered and dropped right after, they are rendered after its sub-elements 
+    but are not part of the tree for queries, serialization or diffs, rows is an iterable (read by one render only),
+    a callable returning a new iterable for every render, or with count a callback making the row of each number
+    """
+    __slots__ = ('_rows', '_count')
+
+    def __init__(
+        self, name: str, rows: Rows, attrs: Optional[dict] = None, value: Optional[HTMLElementValue] = None,
+        count: Optional[int] = None,
+    ) -> None:
+        super().__init__(name, value if value is not None else [], attrs)
+        self._rows: Optional[Rows] = rows
+        self._count = count
+
+    def iter_rows(self) -> Iterator[HTMLElement]:
+        """ yield the rows of the element, made on demand """
+        rows = self._rows
+        if rows is None:
+            raise ValueError('the rows of the lazy element were already read')
+        if self._count is not None:
+            row = cast(Callable[[int], HTMLElement], rows)
+            return (row(number) for number in range(self._count))
+        if callable(rows):
+            return iter(cast(Callable[[], Iterable[HTMLElement]], rows)())
+        items = iter(rows)
+        if items is rows:
+            self._rows = None
+        return items
+
+
+class _TreeBuilder(HTMLParser):
+    """ 
+    tokenizer callbacks that link the elements directly under the open element,
+    text pieces of one element are joined with a space, comments and the doctype are skipped
+    """
+    VOID_TAGS = {'input', 'link'}
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.doc = _Document()
+        self.roots: List[HTMLElement] = []
+        self.open: List[HTMLElement] = []
+        self.data: List[str] = []
+
+    def _flush_text(self) -> None:
+        """ data may arrive in several pieces when the input is chunked """
+        text = ''.join(self.data).strip()
+        self.data.clear()
+        if text and self.open:
+            element = self.open[-1]
+            element._text = text if element._text is None else f'{element._text} {text}'
+
+    def _start(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> HTMLElement:
+        self._flush_text()
+        if tag not in HTMLElement.VALID_TAGS:
+            raise Exception(f'{tag} not vaild name of tag in the HTML')
+        element_attrs = {sys.intern(key): val or '' for key, val in attrs} if attrs else _NO_ATTRS
+        element = HTMLElement._new(sys.intern(tag), element_attrs, None)
+        element._doc = self.doc
+        if 'id' in element_attrs:
+            if element_attrs['id'] in self.doc.ids:
+                raise Exception(f'Duplicate ID {element_attrs["id"]}, Faild to parse')
+            self.doc.ids[element_attrs['id']] = element
+        if self.open:
+            HTMLElement._link(self.open[-1], element)
+        else:
+            self.roots.append(element)
         return element
-    
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        element = self._start(tag, attrs)
+        if tag not in self.VOID_TAGS:
+            self.open.append(element)
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        self._start(tag, attrs)
+
+    def handle_endtag(self, tag: str) -> None:
+        self._flush_text()
+        for position in range(len(self.open) - 1, -1, -1):
+            if self.open[position]._name == tag:
+                del self.open[position:]
+                return
+
+    def handle_data(self, data: str) -> None:
+        self.data.append(data)
+
+    def result(self) -> HTMLElement:
+        self._flush_text()
+        if len(self.roots) != 1:
+            raise ValueError(f'expected one root element, found {len(self.roots)}')
+        return self.roots[0]
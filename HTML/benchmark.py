@@ -0,0 +1,391 @@
+"""
+benchmarks for the HTMLElement library
+run from the repository root: python -m HTML.benchmark index --size 100000
+the suite command times the main operations on synthetic trees and saves the results as JSON,
+a later run compares itself with them: python -m HTML.benchmark suite --output new.json --compare old.json
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from HTML import binary
+from HTML.parallel import render_parallel
+from HTML.HTMLDocument import HTMLDocument
+from HTML.HTMLElement import HTMLElement
+
+
+def build_sections(size: int) -> HTMLElement:
+    """ build a body of div sections with about size elements, each section holds ten paragraphs """
+    body = HTMLElement('body', value=[])
+    count = 1
+    section_no = 0
+    while count < size:
+        section = HTMLElement('div', value=[], attrs={'class': f'section s{section_no % 10}'})
+        for i in range(10):
+            HTMLElement.append(
+                section,
+                HTMLElement('p', value=f'text {i}', attrs={'class': 'card' if i % 5 == 0 else 'row', 'data-i': str(i)}),
+            )
+        HTMLElement.append(body, section)
+        count += 11
+        section_no += 1
+    return body
+
+
+""" nesting depth of the chains of the deep shape, the indent of a rendered element grows with its depth """
+DEEP_DEPTH = 100
+""" sub-elements of every element of the balanced shape """
+BALANCED_FANOUT = 4
+""" cells in a row of the table shape """
+TABLE_COLUMNS = 10
+
+
+def build_wide(size: int) -> HTMLElement:
+    """ a body with size - 1 paragraphs """
+    return HTMLElement('body', value=[
+        HTMLElement('p', value=f'text {i}', attrs={'data-i': str(i % 10)}) for i in range(size - 1)
+    ])
+
+
+def build_deep(size: int) -> HTMLElement:
+    """ a body with chains of DEEP_DEPTH nested divs ending in a paragraph, about size elements """
+    body = HTMLElement('body', value=[])
+    count = 1
+    while count < size:
+        node = body
+        for depth in range(min(DEEP_DEPTH, size - count) - 1):
+            child = HTMLElement('div', value=[], attrs={'data-i': str(depth % 10)})
+            HTMLElement.append(node, child)
+            node = child
+        HTMLElement.append(node, HTMLElement('p', value=f'text {count}', attrs={'data-i': '3'}))
+        count += min(DEEP_DEPTH, size - count)
+    return body
+
+
+def build_balanced(size: int) -> HTMLElement:
+    """ a complete tree of size elements where every element has BALANCED_FANOUT sub-elements, leaves are paragraphs """
+    body = HTMLElement('body', value=[])
+    level = [body]
+    count = 1
+    while count < size:
+        next_level = []
+        for parent in level:
+            for i in range(BALANCED_FANOUT):
+                if count == size:
+                    break
+                child = HTMLElement('div', value=[], attrs={'data-i': str(i)})
+                HTMLElement.append(parent, child)
+                next_level.append(child)
+                count += 1
+        level = next_level
+    for node in level:
+        node.name = 'p'
+        node.text = f'text {node.attrs["data-i"]}'
+    return body
+
+
+def build_table(size: int) -> HTMLElement:
+    """ a table of rows of TABLE_COLUMNS cells, about size elements """
+    table = HTMLElement('table', value=[])
+    count = 1
+    row_no = 0
+    while count < size:
+        row = HTMLElement('tr', value=[], attrs={'id': f'r{row_no}'})
+        for column in range(TABLE_COLUMNS):
+            HTMLElement.append(row, HTMLElement('td', value=f'{row_no}:{column}', attrs={'data-i': str(column)}))
+        HTMLElement.append(table, row)
+        count += TABLE_COLUMNS + 1
+        row_no += 1
+    return table
+
+
+SHAPES: Dict[str, Callable[[int], HTMLElement]] = {
+    'wide': build_wide,
+    'deep': build_deep,
+    'balanced': build_balanced,
+    'table': build_table,
+}
+
+
+def timeit(func: Callable[[], object], repeat: int) -> float:
+    """ best time of repeat calls in seconds """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_index(size: int, repeat: int) -> None:
+    """ compare scanning lookups with indexed lookups on the same tree """
+    root = build_sections(size)
+    queries: Dict[str, Callable[[], List[HTMLElement]]] = {
+        'tag p': lambda: HTMLElement.find_element_by_tag_name(root, 'p'),
+        'tag div': lambda: HTMLElement.find_element_by_tag_name(root, 'div'),
+        'attr data-i=3': lambda: HTMLElement.find_element_by_attrs(root, 'data-i', '3'),
+        'class card': lambda: HTMLElement.find_element_by_class(root, 'card'),
+        'class s7': lambda: HTMLElement.find_element_by_class(root, 's7'),
+    }
+    scanning = {name: timeit(query, repeat) for name, query in queries.items()}
+    start = time.perf_counter()
+    HTMLElement.create_index(root)
+    build = time.perf_counter() - start
+    print(f'{size} elements, index built in {build * 1000:.1f} ms')
+    print(f'{"query":<16}{"matches":>10}{"scan ms":>12}{"index ms":>12}{"speedup":>10}')
+    for name, query in queries.items():
+        indexed = timeit(query, repeat)
+        matches = len(query())
+        print(f'{name:<16}{matches:>10}{scanning[name] * 1000:>12.2f}{indexed * 1000:>12.2f}{scanning[name] / indexed:>9.1f}x')
+
+
+def bench_memory(size: int) -> None:
+    """ report the traced bytes per element of freshly built trees """
+    shapes: Dict[str, Callable[[int], Union[HTMLElement, HTMLDocument]]] = {
+        'bare leaves': lambda n: HTMLElement('div', value=[HTMLElement('p', value=[]) for _ in range(n - 1)]),
+        'text leaves': lambda n: HTMLElement('div', value=[HTMLElement('p', value=f'text {i}') for i in range(n - 1)]),
+        'sections': build_sections,
+        'text leaves doc': lambda n: HTMLDocument.from_element(
+            HTMLElement('div', value=[HTMLElement('p', value=f'text {i}') for i in range(n - 1)])
+        ),
+        'sections doc': lambda n: HTMLDocument.from_element(build_sections(n)),
+    }
+    print(f'{"shape":<16}{"elements":>10}{"bytes/element":>16}')
+    for name, build in shapes.items():
+        gc.collect()
+        tracemalloc.start()
+        root = build(size)
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if isinstance(root, HTMLDocument):
+            count = len(root)
+        else:
+            count = sum(1 for _ in HTMLElement.iter_preorder(root))
+        print(f'{name:<16}{count:>10}{current / count:>16.1f}')
+        del root
+
+
+def bench_serialize(size: int, repeat: int) -> None:
+    """ compare the JSON dict round trip with the binary format """
+    root = build_sections(size)
+    as_json = json.dumps(root.to_dict())
+    as_bytes = binary.dumps(root)
+    rows = [
+        ('json', len(as_json.encode()), timeit(lambda: json.dumps(root.to_dict()), repeat),
+         timeit(lambda: HTMLElement.from_dict(json.loads(as_json)), repeat)),
+        ('binary', len(as_bytes), timeit(lambda: binary.dumps(root), repeat),
+         timeit(lambda: binary.loads(as_bytes), repeat)),
+    ]
+    print(f'{size} elements')
+    print(f'{"format":<10}{"bytes":>12}{"dump ms":>12}{"load ms":>12}')
+    for name, size_bytes, dump, load in rows:
+        print(f'{name:<10}{size_bytes:>12}{dump * 1000:>12.1f}{load * 1000:>12.1f}')
+
+
+def build_card_page(cards: int, values: Optional[Dict[str, str]] = None) -> HTMLElement:
+    """ a page of cards, with values None the texts and attrs that vary are {name} placeholders """
+    def value(name: str) -> str:
+        return f'{{{name}}}' if values is None else values[name]
+
+    body = HTMLElement('body', value=[HTMLElement('h1', value=value('title'), attrs={'class': value('theme')})])
+    for i in range(cards):
+        HTMLElement.append(body, HTMLElement('div', attrs={'class': 'card'}, value=[
+            HTMLElement('h2', value=value(f'name{i}')),
+            HTMLElement('p', value=value(f'text{i}'), attrs={'data-i': str(i)}),
+            HTMLElement('a', value='more', attrs={'href': value(f'link{i}')}),
+        ]))
+    return body
+
+
+def bench_template(cards: int, counts: List[int]) -> None:
+    """ compare rendering a filled tree with rendering its compiled template """
+    values = {'title': 'Catalog', 'theme': 'dark'}
+    for i in range(cards):
+        values.update({f'name{i}': f'item {i}', f'text{i}': f'about item {i}', f'link{i}': f'/items/{i}'})
+    tree = build_card_page(cards, values)
+    start = time.perf_counter()
+    template = HTMLElement.compile(build_card_page(cards))
+    build = time.perf_counter() - start
+    assert template(values) == HTMLElement.render(tree)
+    print(f'{cards * 4 + 2} elements, template compiled in {build * 1000:.2f} ms')
+    print(f'{"renders":>10}{"render ms":>14}{"template ms":>14}{"speedup":>10}')
+    for count in counts:
+        rendered = timeit(lambda: [HTMLElement.render(tree) for _ in range(count)], 1)
+        compiled = timeit(lambda: [template(values) for _ in range(count)], 1)
+        print(f'{count:>10}{rendered * 1000:>14.1f}{compiled * 1000:>14.1f}{rendered / compiled:>9.1f}x')
+
+
+def bench_parallel(size: int, workers: List[int], repeat: int) -> None:
+    """ compare the serial render with render_parallel for several numbers of workers """
+    root = build_sections(size)
+    HTMLElement.render(root)
+    serial = timeit(lambda: HTMLElement.render(root), repeat)
+    print(f'{size} elements, serial render {serial * 1000:.1f} ms')
+    print(f'{"workers":>8}{"ms":>10}{"speedup":>10}')
+    for count in workers:
+        parallel = timeit(lambda: render_parallel(root, workers=count, threshold=0), repeat)
+        print(f'{count:>8}{parallel * 1000:>10.1f}{serial / parallel:>9.1f}x')
+
+
+def remove_half(root: HTMLElement) -> None:
+    """ remove every other sub-element of root """
+    for child in root.children[::2]:
+        HTMLElement.remove(root, child)
+
+
+def suite_operations(
+    shape: Callable[[int], HTMLElement], size: int, fresh: List[HTMLElement],
+) -> Dict[str, Tuple[Callable[[], Any], bool]]:
+    """ 
+    the operations of the suite on a tree of the shape, each with a flag telling if it changes the tree,
+    those take a new tree from fresh on every run
+    """
+    root = shape(size)
+    as_dict = root.to_dict()
+
+    def remove() -> None:
+        remove_half(fresh.pop())
+
+    return {
+        'append': (lambda: shape(size), False),
+        'render': (lambda: HTMLElement.render(root), False),
+        'find_tag': (lambda: HTMLElement.find_element_by_tag_name(root, 'p'), False),
+        'find_attr': (lambda: HTMLElement.find_element_by_attrs(root, 'data-i', '3'), False),
+        'clone': (lambda: HTMLElement.clone(None, root), False),
+        'remove': (remove, True),
+        'to_dict': (lambda: root.to_dict(), False),
+        'from_dict': (lambda: HTMLElement.from_dict(as_dict), False),
+    }
+
+
+def run_suite(
+    shapes: List[str], sizes: List[int], operations: Optional[List[str]], repeat: int, memory: bool,
+) -> List[Dict[str, Any]]:
+    """ the best time in seconds and the peak traced bytes of every operation on every shape and size """
+    results = []
+    print(f'{"shape":<10}{"size":>10}{"operation":>12}{"ms":>12}{"peak KiB":>12}')
+    for shape_name in shapes:
+        shape = SHAPES[shape_name]
+        for size in sizes:
+            gc.collect()
+            fresh: List[HTMLElement] = []
+            ops = suite_operations(shape, size, fresh)
+            for name, (operation, changes) in ops.items():
+                if operations and name not in operations:
+                    continue
+                runs = repeat + 1 if memory else repeat
+                if changes:
+                    fresh.extend(shape(size) for _ in range(runs))
+                seconds = timeit(operation, repeat)
+                peak = None
+                if memory:
+                    gc.collect()
+                    tracemalloc.start()
+                    operation()
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                results.append({'shape': shape_name, 'size': size, 'operation': name, 'seconds': seconds, 'peak_bytes': peak})
+                peak_text = '-' if peak is None else f'{peak / 1024:.0f}'
+                print(f'{shape_name:<10}{size:>10}{name:>12}{seconds * 1000:>12.2f}{peak_text:>12}')
+            del ops, fresh
+    return results
+
+
+def compare_results(old: List[Dict[str, Any]], new: List[Dict[str, Any]], threshold: float) -> List[Dict[str, Any]]:
+    """ print the time ratios of the runs found in both results, return the new runs slower than threshold times """
+    baseline = {(run['shape'], run['size'], run['operation']): run for run in old}
+    regressions = []
+    print(f'{"shape":<10}{"size":>10}{"operation":>12}{"old ms":>12}{"new ms":>12}{"ratio":>8}')
+    for run in new:
+        before = baseline.get((run['shape'], run['size'], run['operation']))
+        if before is None:
+            continue
+        ratio = run['seconds'] / before['seconds'] if before['seconds'] else float('inf')
+        flag = ''
+        if ratio > threshold:
+            regressions.append(run)
+            flag = '  slower'
+        print(
+            f'{run["shape"]:<10}{run["size"]:>10}{run["operation"]:>12}{before["seconds"] * 1000:>12.2f}'
+            f'{run["seconds"] * 1000:>12.2f}{ratio:>7.2f}x{flag}'
+        )
+    return regressions
+
+
+def bench_suite(
+    shapes: List[str], sizes: List[int], operations: Optional[List[str]], repeat: int, memory: bool,
+    output: Optional[str], compare: Optional[str], threshold: float,
+) -> None:
+    """ run the suite, save it as JSON and exit with status 1 when an operation got slower than the compared run """
+    results = run_suite(shapes, sizes, operations, repeat, memory)
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'machine': platform.machine(),
+        'repeat': repeat,
+        'results': results,
+    }
+    if output:
+        with open(output, 'w') as stream:
+            json.dump(report, stream, indent=2)
+    if compare:
+        with open(compare) as stream:
+            regressions = compare_results(json.load(stream)['results'], results, threshold)
+        if regressions:
+            print(f'{len(regressions)} operations slower than {threshold}x the compared run')
+            raise SystemExit(1)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest='command', required=True)
+    index = commands.add_parser('index', help='indexed vs scanning find_element_by_* lookups')
+    index.add_argument('--size', type=int, default=100_000)
+    index.add_argument('--repeat', type=int, default=5)
+    memory = commands.add_parser('memory', help='tracemalloc bytes per element')
+    memory.add_argument('--size', type=int, default=100_000)
+    serialize = commands.add_parser('serialize', help='JSON dicts vs the binary format')
+    serialize.add_argument('--size', type=int, default=100_000)
+    serialize.add_argument('--repeat', type=int, default=3)
+    template = commands.add_parser('template', help='HTMLElement.render vs compiled templates')
+    template.add_argument('--cards', type=int, default=10)
+    template.add_argument('--counts', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parallel = commands.add_parser('parallel', help='serial render vs render_parallel')
+    parallel.add_argument('--size', type=int, default=300_000)
+    parallel.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8])
+    parallel.add_argument('--repeat', type=int, default=3)
+    suite = commands.add_parser('suite', help='time and peak memory of the main operations, saved as JSON')
+    suite.add_argument('--shapes', nargs='+', choices=list(SHAPES), default=list(SHAPES))
+    suite.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000])
+    suite.add_argument('--operations', nargs='+', help='only these operations, all of them by default')
+    suite.add_argument('--repeat', type=int, default=3)
+    suite.add_argument('--no-memory', dest='memory', action='store_false', help='skip the traced run of the peak memory')
+    suite.add_argument('--output', help='write the results to this JSON file')
+    suite.add_argument('--compare', help='JSON file of an earlier run to compare with')
+    suite.add_argument('--threshold', type=float, default=1.25, help='time ratio reported as a regression')
+    args = parser.parse_args(argv)
+    if args.command == 'index':
+        bench_index(args.size, args.repeat)
+    elif args.command == 'memory':
+        bench_memory(args.size)
+    elif args.command == 'serialize':
+        bench_serialize(args.size, args.repeat)
+    elif args.command == 'template':
+        bench_template(args.cards, args.counts)
+    elif args.command == 'parallel':
+        bench_parallel(args.size, args.workers, args.repeat)
+    elif args.command == 'suite':
+        bench_suite(
+            args.shapes, args.sizes, args.operations, args.repeat, args.memory, args.output, args.compare, args.threshold,
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+compact binary format for HTMLElement trees
+
+layout (all integers are unsigned 32 bit little endian):
+    magic b'HTB1', or b'HTB2' when identical sub trees are stored once
+    string count, node int count, utf-8 blob length
+    string lengths (in characters), one per string
+    node ints, one record per element in document order:
+        tag string, attr count, (key string, value string) per attr, text string + 1 (0 for no text), child count
+        with HTB2 a record can also be REF and the number of an earlier record whose sub tree it repeats
+    utf-8 blob of every distinct string
+"""
+import struct
+import sys
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from HTML.HTMLElement import HTMLElement, _Document, _NO_ATTRS, _gc_paused
+
+MAGIC = b'HTB1'
+MAGIC_DEDUP = b'HTB2'
+REF = 0xFFFFFFFF
+_HEADER = struct.Struct('<4sIII')
+
+
+def _u32(values: List[int]) -> array:
+    ints = array('I', values)
+    if sys.byteorder == 'big':
+        ints.byteswap()
+    return ints
+
+
+def dumps(root: HTMLElement, dedup: bool = False) -> bytes:
+    """ serialize the tree of root to bytes, with dedup identical sub trees are written once using their digests """
+    strings: Dict[str, int] = {}
+    ints: List[int] = []
+    records: Dict[bytes, int] = {}
+    repeated: Optional[HTMLElement] = None
+    if dedup:
+        HTMLElement._digest(root)
+    for record, node in enumerate(HTMLElement.iter_preorder(root, prune=lambda node: node is repeated)):
+        if dedup and node._first is not None and node._hash:
+            if node._hash in records:
+                ints.append(REF)
+                ints.append(records[node._hash])
+                repeated = node
+                continue
+            records[node._hash] = record
+        ints.append(strings.setdefault(node._name, len(strings)))
+        ints.append(len(node._attrs))
+        for key, value in node._attrs.items():
+            ints.append(strings.setdefault(key, len(strings)))
+            """ values are written as they render, a non-str value is loaded back as its str """
+            ints.append(strings.setdefault(value if value.__class__ is str else str(value), len(strings)))
+        ints.append(0 if node._text is None else strings.setdefault(node._text, len(strings)) + 1)
+        count = 0
+        child = node._first
+        while child is not None:
+            count += 1
+            child = child._next
+        ints.append(count)
+    blob = ''.join(strings).encode('utf-8')
+    return b''.join((
+        _HEADER.pack(MAGIC_DEDUP if dedup else MAGIC, len(strings), len(ints), len(blob)),
+        _u32([len(string) for string in strings]).tobytes(),
+        _u32(ints).tobytes(),
+        blob,
+    ))
+
+
+def _read_u32(data: bytes, offset: int, count: int) -> Tuple[array, int]:
+    ints = array('I')
+    end = offset + 4 * count
+    ints.frombytes(data[offset:end])
+    if sys.byteorder == 'big':
+        ints.byteswap()
+    return ints, end
+
+
+def loads(data: bytes) -> HTMLElement:
+    """ rebuild a tree serialized by dumps, with its id registry """
+    if len(data) < _HEADER.size:
+        raise ValueError('not an HTMLElement binary tree')
+    magic, string_count, int_count, blob_size = _HEADER.unpack_from(data)
+    if magic != MAGIC and magic != MAGIC_DEDUP:
+        raise ValueError('not an HTMLElement binary tree')
+    lengths, offset = _read_u32(data, _HEADER.size, string_count)
+    int_array, offset = _read_u32(data, offset, int_count)
+    ints = int_array.tolist()
+    text = data[offset:offset + blob_size].decode('utf-8')
+    strings: List[str] = []
+    start = 0
+    for length in lengths:
+        strings.append(text[start:start + length])
+        start += length
+    names: Dict[int, str] = {}
+    keys: Dict[int, str] = {}
+    doc = _Document()
+    new = HTMLElement._new
+    link = HTMLElement._link
+    root = None
+    stack: List[List] = []
+    """ the element of every record, kept only when records can be repeated """
+    elements: List[HTMLElement] = []
+    keep = magic == MAGIC_DEDUP
+    position = 0
+    with _gc_paused():
+        while position < int_count:
+            tag = ints[position]
+            if tag == REF:
+                element = HTMLElement.clone(None, elements[ints[position + 1]], share=True)
+                element._document().forward = doc
+                elements.append(element)
+                position += 2
+                link(stack[-1][0], element)
+                stack[-1][1] -= 1
+                while stack and not stack[-1][1]:
+                    stack.pop()
+                continue
+            name = names.get(tag)
+            if name is None:
+                name = names[tag] = sys.intern(strings[tag])
+                if name not in HTMLElement.VALID_TAGS:
+                    raise Exception(f'{name} not vaild name of tag in the HTML')
+            attr_count = ints[position + 1]
+            position += 2
+            attrs = _NO_ATTRS
+            if attr_count:
+                attrs = {}
+                for _ in range(attr_count):
+                    key = keys.get(ints[position])
+                    if key is None:
+                        key = keys[ints[position]] = sys.intern(strings[ints[position]])
+                    attrs[key] = strings[ints[position + 1]]
+                    position += 2
+            text_ref = ints[position]
+            children = ints[position + 1]
+            position += 2
+            element = new(name, attrs, strings[text_ref - 1] if text_ref else None)
+            element._doc = doc
+            if keep:
+                elements.append(element)
+            if 'id' in attrs:
+                if attrs['id'] in doc.ids:
+                    raise Exception('Duplicate ID, Faild to append')
+                doc.ids[attrs['id']] = element
+            if stack:
+                link(stack[-1][0], element)
+                stack[-1][1] -= 1
+            else:
+                root = element
+            if children:
+                stack.append([element, children])
+            while stack and not stack[-1][1]:
+                stack.pop()
+    if root is None:
+        raise ValueError('not an HTMLElement binary tree')
+    return root
@@ -0,0 +1,245 @@
+"""
+diff and patch of HTMLElement trees
+
+diff(old, new) returns the operations turning old into new, each one a JSON friendly dict
+whose path is the list of sub-element positions leading from the root to an element:
+    {'op': 'remove', 'path': path}                                     remove the element at path
+    {'op': 'insert', 'path': path, 'index': i, 'node': to_dict()}      insert a new sub-element i
+    {'op': 'move', 'path': path, 'from': i, 'to': j}                   move sub-element i to position j
+    {'op': 'set_attr', 'path': path, 'name': name, 'value': value}     a None value removes the attr
+    {'op': 'set_attrs', 'path': path, 'attrs': attrs}                  all the attrs, when new keys change their order
+    {'op': 'set_text', 'path': path, 'text': text}
+    {'op': 'replace', 'path': [], 'node': to_dict()}                   the roots have different tags
+sub-elements with an id are matched by id and the others by tag in order, the removals come first
+(last ones first) so the ids they free can be inserted again, and the sub-elements that keep
+their place are a longest increasing subsequence so only the others are moved. the positions of the moves
+come from a Fenwick tree over the order the sub-elements have while patching and apply_patch keeps the
+sub-elements of every element it reaches in a list, so neither walks the siblings for every operation
+"""
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from HTML.HTMLElement import HTMLElement
+
+Operation = Dict[str, Any]
+
+
+def _match_children(old: HTMLElement, new: HTMLElement) -> List[Tuple[HTMLElement, Optional[HTMLElement]]]:
+    """ pair every sub-element of new with the sub-element of old it updates, None for the new ones """
+    keyed: Dict[str, HTMLElement] = {}
+    unkeyed: Dict[str, Deque[HTMLElement]] = {}
+    for child in old.iter_children():
+        key = child._attrs.get('id')
+        if key is None:
+            unkeyed.setdefault(child._name, deque()).append(child)
+        else:
+            keyed[key] = child
+    pairs: List[Tuple[HTMLElement, Optional[HTMLElement]]] = []
+    for child in new.iter_children():
+        key = child._attrs.get('id')
+        match: Optional[HTMLElement]
+        if key is None:
+            queue = unkeyed.get(child._name)
+            match = queue.popleft() if queue else None
+        else:
+            match = keyed.get(key)
+            if match is not None and match._name != child._name:
+                match = None
+        pairs.append((child, match))
+    return pairs
+
+
+def _stable(ranks: List[int]) -> Set[int]:
+    """ the ranks of a longest increasing subsequence, O(n log n) patience sorting """
+    tails: List[int] = []
+    tail_at: List[int] = []
+    previous: List[int] = []
+    for i, rank in enumerate(ranks):
+        position = bisect_left(tails, rank)
+        if position == len(tails):
+            tails.append(rank)
+            tail_at.append(i)
+        else:
+            tails[position] = rank
+            tail_at[position] = i
+        previous.append(tail_at[position - 1] if position else -1)
+    stable: Set[int] = set()
+    i = tail_at[-1] if tail_at else -1
+    while i != -1:
+        stable.add(ranks[i])
+        i = previous[i]
+    return stable
+
+
+class _Counts:
+    """ Fenwick tree of 0/1 counts, prefix sums and updates in O(log n) """
+    __slots__ = ('tree',)
+
+    def __init__(self, size: int) -> None:
+        self.tree = [0] * (size + 1)
+
+    def add(self, position: int, delta: int) -> None:
+        tree = self.tree
+        i = position + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def before(self, position: int) -> int:
+        """ the sum of the counts at the positions lower than position """
+        tree = self.tree
+        total = 0
+        i = position
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+
+def _diff_element(old: HTMLElement, new: HTMLElement, path: List[int], changes: List[Operation]) -> None:
+    old_attrs, new_attrs = old._attrs, new._attrs
+    if old_attrs != new_attrs:
+        if [name for name in old_attrs if name in new_attrs] != list(new_attrs):
+            """ a new key would land after the others, the whole attrs keep the order of new """
+            changes.append({'op': 'set_attrs', 'path': path, 'attrs': dict(new_attrs)})
+            return
+        for name, value in new_attrs.items():
+            if old_attrs.get(name) != value:
+                changes.append({'op': 'set_attr', 'path': path, 'name': name, 'value': value})
+        for name in old_attrs:
+            if name not in new_attrs:
+                changes.append({'op': 'set_attr', 'path': path, 'name': name, 'value': None})
+    if old._text != new._text:
+        changes.append({'op': 'set_text', 'path': path, 'text': new._text})
+
+
+def diff(old: HTMLElement, new: HTMLElement) -> List[Operation]:
+    """ the operations turning the tree of old into the tree of new """
+    if old._name != new._name:
+        return [{'op': 'replace', 'path': [], 'node': new.to_dict()}]
+    removals: List[List[int]] = []
+    changes: List[Operation] = []
+    stack: List[Tuple[HTMLElement, HTMLElement, List[int], List[int]]] = [(old, new, [], [])]
+    while stack:
+        old_node, new_node, old_path, path = stack.pop()
+        _diff_element(old_node, new_node, path, changes)
+        pairs = _match_children(old_node, new_node)
+        matched = {match: None for _, match in pairs if match is not None}
+        old_positions: Dict[HTMLElement, int] = {}
+        kept: List[HTMLElement] = []
+        for position, child in enumerate(old_node.iter_children()):
+            if child in matched:
+                old_positions[child] = position
+                kept.append(child)
+            else:
+                removals.append(old_path + [position])
+        rank = {child: i for i, child in enumerate(kept)}
+        stable = _stable([rank[match] for _, match in pairs if match is not None])
+        """ 
+        while patching an element placed at new position n, or one that stays, sorts at (n, 0, 0), and one
+        still waiting to move sorts at (n, -1, rank) before the next staying element n in old order, the
+        current position of an element is the number of elements present with a lower key
+        """
+        new_position = {match: position for position, (_, match) in enumerate(pairs) if match is not None}
+        waiting: Dict[HTMLElement, Tuple[int, int, int]] = {}
+        next_stable = len(pairs)
+        for child in reversed(kept):
+            if rank[child] in stable:
+                next_stable = new_position[child]
+            else:
+                waiting[child] = (next_stable, -1, rank[child])
+        keys = sorted([(position, 0, 0) for position in range(len(pairs))] + list(waiting.values()))
+        slot = {key: i for i, key in enumerate(keys)}
+        present = _Counts(len(keys))
+        for child in kept:
+            present.add(slot[waiting.get(child, (new_position[child], 0, 0))], 1)
+        for placed, (child, match) in enumerate(pairs):
+            key = slot[(placed, 0, 0)]
+            if match is None:
+                present.add(key, 1)
+                changes.append({'op': 'insert', 'path': path, 'index': present.before(key), 'node': child.to_dict()})
+            elif match in waiting:
+                start = present.before(slot[waiting[match]])
+                present.add(slot[waiting[match]], -1)
+                present.add(key, 1)
+                to = present.before(key)
+                if start != to:
+                    changes.append({'op': 'move', 'path': path, 'from': start, 'to': to})
+        for position in range(len(pairs) - 1, -1, -1):
+            child, match = pairs[position]
+            if match is not None:
+                stack.append((match, child, old_path + [old_positions[match]], path + [position]))
+    removals.sort(reverse=True)
+    return [{'op': 'remove', 'path': path} for path in removals] + changes
+
+
+class _Children:
+    """ the sub-elements of the elements reached by a patch, listed once and kept in step with the patch """
+    __slots__ = ('lists',)
+
+    def __init__(self) -> None:
+        self.lists: Dict[HTMLElement, List[HTMLElement]] = {}
+
+    def of(self, element: HTMLElement) -> List[HTMLElement]:
+        children = self.lists.get(element)
+        if children is None:
+            children = self.lists[element] = element.children
+        return children
+
+    def child(self, element: HTMLElement, position: int) -> HTMLElement:
+        children = self.of(element)
+        if not 0 <= position < len(children):
+            raise ValueError(f'no sub-element {position} in {element._name}')
+        return children[position]
+
+    def resolve(self, root: HTMLElement, path: List[int]) -> HTMLElement:
+        element = root
+        for position in path:
+            element = self.child(element, position)
+        return element
+
+
+def apply_patch(root: HTMLElement, patch: List[Operation]) -> HTMLElement:
+    """ apply the operations of diff to the tree of root in place and return its root """
+    children = _Children()
+    for operation in patch:
+        op = operation['op']
+        if op == 'replace':
+            root = HTMLElement.from_dict(operation['node'])
+            children = _Children()
+            continue
+        path = operation['path']
+        if op == 'remove':
+            if not path:
+                raise ValueError('the root can not be removed')
+            parent = children.resolve(root, path[:-1])
+            children.child(parent, path[-1]).detach()
+            children.of(parent).pop(path[-1])
+            continue
+        element = children.resolve(root, path)
+        if op == 'insert':
+            siblings = children.of(element)
+            index = min(operation['index'], len(siblings))
+            node = HTMLElement.from_dict(operation['node'])
+            HTMLElement.insert_before(element, node, siblings[index] if index < len(siblings) else None)
+            siblings.insert(index, node)
+        elif op == 'move':
+            siblings = children.of(element)
+            child = children.child(element, operation['from'])
+            siblings.pop(operation['from'])
+            to = min(operation['to'], len(siblings))
+            HTMLElement.insert_before(element, child, siblings[to] if to < len(siblings) else None)
+            siblings.insert(to, child)
+        elif op == 'set_attrs':
+            element.attrs = operation['attrs']
+        elif op == 'set_attr':
+            if operation['value'] is None:
+                element.attrs.pop(operation['name'], None)
+            else:
+                element.attrs[operation['name']] = operation['value']
+        elif op == 'set_text':
+            element.text = operation['text']
+        else:
+            raise ValueError(f'unknown patch operation {op!r}')
+    return root
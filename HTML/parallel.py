@@ -0,0 +1,86 @@
+"""
+render the sub-elements of a large root in a process pool
+
+the sub-elements are split in contiguous chunks of about the same number of elements and the html of
+the chunks is joined in order. with the fork start method the workers inherit the tree and only get
+the positions of their chunk, otherwise every chunk is sent in the compact binary format of HTML.binary
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from HTML import binary
+from HTML.HTMLElement import HTMLElement, LazyElement
+
+""" below this number of elements the tree is rendered in the calling process """
+PARALLEL_THRESHOLD = 20_000
+""" chunks made for each worker so a slow chunk does not keep the others waiting """
+CHUNKS_PER_WORKER = 4
+
+""" sub-elements of the root being rendered, inherited by forked workers """
+_shared: List[HTMLElement] = []
+
+
+def _render_shared(start: int, stop: int, space: int) -> str:
+    return '\n'.join([HTMLElement.render(child, space) for child in _shared[start:stop]])
+
+
+def _render_blobs(blobs: List[bytes], space: int) -> str:
+    return '\n'.join([HTMLElement.render(binary.loads(blob), space) for blob in blobs])
+
+
+def _chunks(sizes: List[int], count: int) -> List[Tuple[int, int]]:
+    """ split the sub-elements in at most count ranges of about the same number of elements """
+    target = sum(sizes) / count
+    chunks: List[Tuple[int, int]] = []
+    start = 0
+    total = 0
+    for position, size in enumerate(sizes):
+        total += size
+        if total >= target * (len(chunks) + 1) or position == len(sizes) - 1:
+            chunks.append((start, position + 1))
+            start = position + 1
+    return chunks
+
+
+def render_parallel(
+    root: HTMLElement, workers: Optional[int] = None, space: int = 0, threshold: int = PARALLEL_THRESHOLD,
+) -> str:
+    """
+    render like HTMLElement.render with the sub-elements of root rendered by workers processes,
+    small trees, trees with lazy elements and a single worker are rendered serially
+    """
+    global _shared
+    if root is None:
+        return 'the element empty'
+    workers = workers or os.cpu_count() or 1
+    children = root.children
+    sizes = []
+    for child in children:
+        size = 0
+        for node in HTMLElement.iter_preorder(child):
+            if node.__class__ is LazyElement:
+                return HTMLElement.render(root, space)
+            size += 1
+        sizes.append(size)
+    if workers < 2 or len(children) < 2 or sum(sizes) < threshold or root.__class__ is LazyElement:
+        return HTMLElement.render(root, space)
+    chunks = _chunks(sizes, workers * CHUNKS_PER_WORKER)
+    fork = 'fork' in multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if fork else None)
+    try:
+        _shared = children
+        with ProcessPoolExecutor(min(workers, len(chunks)), mp_context=context) as executor:
+            if fork:
+                futures = [executor.submit(_render_shared, start, stop, space + 4) for start, stop in chunks]
+            else:
+                futures = [
+                    executor.submit(_render_blobs, [binary.dumps(child) for child in children[start:stop]], space + 4)
+                    for start, stop in chunks
+                ]
+            parts = [future.result() for future in futures]
+    finally:
+        _shared = []
+    html = '\n'.join(parts)
+    return f'{HTMLElement._render_open(root, space)}{html}{" " * space}</{root.name}>\n'
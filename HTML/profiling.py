@@ -0,0 +1,179 @@
+"""
+opt-in profiling of HTMLElement
+
+    with HTMLElement.profile() as profile:
+        with profile.phase('build'):
+            page = build_page()
+        profile.on('render', lambda element, chars, seconds: print(element.name, chars, seconds))
+        with profile.phase('render'):
+            html = HTMLElement.render(page)
+    print(profile.report())
+
+while a profile is active the methods of HTMLElement below are replaced by counting wrappers and the
+originals are put back when it ends, so nothing is paid when profiling is off. the wrappers are on the
+class so a profile sees every tree of the process, profiles can not be nested
+"""
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from HTML.HTMLElement import HTMLElement
+
+""" events a hook can be registered for and the arguments of its callbacks """
+EVENTS = {
+    'append': '(parent, child)',
+    'remove': '(parent, element)',
+    'render': '(element, chars, seconds)',
+}
+QUERIES = ('find_element_by_tag_name', 'find_element_by_attrs', 'find_element_by_class', 'get_element_by_id')
+
+_active: Optional['Profile'] = None
+
+
+class Profile:
+    """
+    counters of the HTMLElement operations made while the profile is active:
+    appends, id_checks (ids checked for uniqueness by append), removes, queries, nodes_visited
+    (elements walked by queries, renders and bookkeeping), renders and render_chars (characters rendered),
+    queries_log holds (query, nodes visited, matches, seconds) for every query
+    """
+    __slots__ = ('counters', 'timings', 'queries_log', 'hooks', '_render_depth')
+
+    def __init__(self) -> None:
+        self.counters: Dict[str, int] = dict.fromkeys(
+            ('appends', 'id_checks', 'removes', 'queries', 'nodes_visited', 'renders', 'render_chars'), 0
+        )
+        self.timings: Dict[str, float] = {}
+        self.queries_log: List[Tuple[str, int, int, float]] = []
+        self.hooks: Dict[str, List[Callable[..., Any]]] = {event: [] for event in EVENTS}
+        self._render_depth = 0
+
+    def on(self, event: str, callback: Callable[..., Any]) -> None:
+        """ call callback after every event of the kind, see EVENTS for its arguments """
+        if event not in EVENTS:
+            raise ValueError(f'{event} not an event, use one of {sorted(EVENTS)}')
+        self.hooks[event].append(callback)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """ add the time spent in the block to timings[name] """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def report(self) -> str:
+        """ the counters and the phase timings as text """
+        lines = [f'{name:<16}{value:>12}' for name, value in self.counters.items()]
+        lines += [f'{name:<16}{seconds * 1000:>10.1f}ms' for name, seconds in self.timings.items()]
+        return '\n'.join(lines)
+
+
+def _wrap_append(profile: Profile, append: Callable[..., None]) -> Callable[..., None]:
+    def wrapper(cls: type, parent: HTMLElement, child: Any) -> None:
+        if isinstance(child, HTMLElement):
+            profile.counters['appends'] += 1
+            if child._doc is not None:
+                profile.counters['id_checks'] += len(child._document().ids)
+            elif 'id' in child._attrs:
+                profile.counters['id_checks'] += 1
+            append(cls, parent, child)
+            for callback in profile.hooks['append']:
+                callback(parent, child)
+        else:
+            append(cls, parent, child)
+    return wrapper
+
+
+def _wrap_detach_all(profile: Profile, detach_all: Callable[..., None]) -> Callable[..., None]:
+    """ detach, remove and the value setter all go through detach_all """
+    def wrapper(cls: type, elements: List[HTMLElement]) -> None:
+        parents = [(element, element.parent) for element in elements if element.parent is not None]
+        detach_all(cls, elements)
+        profile.counters['removes'] += len(parents)
+        for callback in profile.hooks['remove']:
+            for element, parent in parents:
+                callback(parent, element)
+    return wrapper
+
+
+def _wrap_walk(profile: Profile, walk: Callable[..., Iterator[Any]], entering: bool) -> Callable[..., Iterator[Any]]:
+    """ count the elements yielded by iter_preorder, or entered by walk """
+    counters = profile.counters
+
+    def wrapper(cls: type, *args: Any, **kwargs: Any) -> Iterator[Any]:
+        for item in walk(cls, *args, **kwargs):
+            if not entering or item[2]:
+                counters['nodes_visited'] += 1
+            yield item
+    return wrapper
+
+
+def _wrap_query(profile: Profile, name: str, query: Callable[..., Any]) -> Callable[..., Any]:
+    counters = profile.counters
+
+    def wrapper(cls: type, *args: Any, **kwargs: Any) -> Any:
+        visited = counters['nodes_visited']
+        start = time.perf_counter()
+        found = query(cls, *args, **kwargs)
+        seconds = time.perf_counter() - start
+        counters['queries'] += 1
+        matches = len(found) if isinstance(found, list) else int(found is not None)
+        profile.queries_log.append((name, counters['nodes_visited'] - visited, matches, seconds))
+        return found
+    return wrapper
+
+
+def _wrap_iter_render(profile: Profile, iter_render: Callable[..., Iterator[str]]) -> Callable[..., Iterator[str]]:
+    """ count the characters of the outermost render only, lazy rows are rendered by nested calls """
+    counters = profile.counters
+
+    def wrapper(cls: type, element: HTMLElement, *args: Any, **kwargs: Any) -> Iterator[str]:
+        if profile._render_depth:
+            yield from iter_render(cls, element, *args, **kwargs)
+            return
+        profile._render_depth += 1
+        chars = 0
+        start = time.perf_counter()
+        try:
+            for chunk in iter_render(cls, element, *args, **kwargs):
+                chars += len(chunk)
+                yield chunk
+        finally:
+            profile._render_depth -= 1
+        seconds = time.perf_counter() - start
+        counters['renders'] += 1
+        counters['render_chars'] += chars
+        for callback in profile.hooks['render']:
+            callback(element, chars, seconds)
+    return wrapper
+
+
+@contextmanager
+def profile() -> Iterator[Profile]:
+    """ profile the HTMLElement operations made in the block """
+    global _active
+    if _active is not None:
+        raise RuntimeError('a profile is already active')
+    active = _active = Profile()
+    originals = {
+        name: HTMLElement.__dict__[name] for name in ('append', 'detach_all', 'walk', 'iter_preorder', 'iter_render', *QUERIES)
+    }
+    wrapped: Dict[str, Any] = {
+        'append': classmethod(_wrap_append(active, originals['append'].__func__)),
+        'detach_all': classmethod(_wrap_detach_all(active, originals['detach_all'].__func__)),
+        'walk': classmethod(_wrap_walk(active, originals['walk'].__func__, True)),
+        'iter_preorder': classmethod(_wrap_walk(active, originals['iter_preorder'].__func__, False)),
+        'iter_render': classmethod(_wrap_iter_render(active, originals['iter_render'].__func__)),
+    }
+    for name in QUERIES:
+        wrapped[name] = classmethod(_wrap_query(active, name, originals[name].__func__))
+    try:
+        for name, method in wrapped.items():
+            setattr(HTMLElement, name, method)
+        yield active
+    finally:
+        for name, method in originals.items():
+            setattr(HTMLElement, name, method)
+        _active = None
@@ -0,0 +1,200 @@
+"""
+CSS selector queries for HTMLElement trees
+
+supported: tag, *, #id, .class, [attr], [attr=value] with the =, ~=, ^=, $=, *= and |= operators,
+the descendant ( ), child (>), adjacent sibling (+) and general sibling (~) combinators
+and groups separated by commas, selectors are parsed once and kept in an LRU cache
+"""
+import re
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from HTML.HTMLElement import HTMLElement
+
+_TOKEN = re.compile(r'''
+    \s*(?P<comb>[>+~,])\s*
+  | (?P<space>\s+)
+  | (?P<tag>\*|[a-zA-Z][\w-]*)
+  | \#(?P<id>[\w-]+)
+  | \.(?P<cls>[\w-]+)
+  | \[\s*(?P<attr>[\w-]+)\s*
+    (?:(?P<op>[~^$*|]?=)\s*(?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<bare>[\w-]+))\s*)?\]
+''', re.VERBOSE)
+
+_ATTR_OPS: Dict[str, Callable[[str, str], bool]] = {
+    '=': lambda actual, value: actual == value,
+    '~=': lambda actual, value: value in actual.split(),
+    '^=': lambda actual, value: bool(value) and actual.startswith(value),
+    '$=': lambda actual, value: bool(value) and actual.endswith(value),
+    '*=': lambda actual, value: bool(value) and value in actual,
+    '|=': lambda actual, value: actual == value or actual.startswith(value + '-'),
+}
+
+
+class Compound(NamedTuple):
+    """ one simple selector sequence like div.card[data-x] """
+    tag: Optional[str]
+    id: Optional[str]
+    classes: Tuple[str, ...]
+    attrs: Tuple[Tuple[str, Optional[str], str], ...]
+
+
+class Complex(NamedTuple):
+    """ compounds joined by combinators, combinators[i] sits between compounds[i] and compounds[i + 1] """
+    compounds: Tuple[Compound, ...]
+    combinators: Tuple[str, ...]
+
+
+Selector = Tuple[Complex, ...]
+
+
+@lru_cache(maxsize=256)
+def compile_selector(selector: str) -> Selector:
+    """ parse a selector group into its complex selectors """
+    complexes: List[Complex] = []
+    compounds: List[Compound] = []
+    combinators: List[str] = []
+    tag: Optional[str] = None
+    id: Optional[str] = None
+    classes: List[str] = []
+    attrs: List[Tuple[str, Optional[str], str]] = []
+    empty = True
+    text = selector.strip()
+    pos = 0
+    while True:
+        match = _TOKEN.match(text, pos) if pos < len(text) else None
+        if pos < len(text) and match is None:
+            raise ValueError(f'invalid selector: {selector!r}')
+        if match is None or match['comb'] or match['space']:
+            if empty:
+                raise ValueError(f'invalid selector: {selector!r}')
+            compounds.append(Compound(tag, id, tuple(classes), tuple(attrs)))
+            tag, id, classes, attrs, empty = None, None, [], [], True
+            if match is None or match['comb'] == ',':
+                complexes.append(Complex(tuple(compounds), tuple(combinators)))
+                compounds, combinators = [], []
+                if match is None:
+                    return tuple(complexes)
+            else:
+                combinators.append(match['comb'] or ' ')
+        elif match['tag']:
+            if not empty:
+                raise ValueError(f'invalid selector: {selector!r}')
+            tag = None if match['tag'] == '*' else match['tag'].lower()
+            empty = False
+        elif match['id']:
+            id = match['id']
+            empty = False
+        elif match['cls']:
+            classes.append(match['cls'])
+            empty = False
+        else:
+            value = next((v for v in (match['dq'], match['sq'], match['bare']) if v is not None), '')
+            attrs.append((match['attr'], match['op'], value))
+            empty = False
+        pos = match.end()
+
+
+def _match_compound(element: HTMLElement, compound: Compound) -> bool:
+    if compound.tag is not None and element._name != compound.tag:
+        return False
+    attrs = element._attrs
+    if compound.id is not None and attrs.get('id') != compound.id:
+        return False
+    if compound.classes:
+        tokens = attrs.get('class', '').split()
+        if any(name not in tokens for name in compound.classes):
+            return False
+    for name, op, value in compound.attrs:
+        actual = attrs.get(name)
+        if actual is None or (op is not None and not _ATTR_OPS[op](actual, value)):
+            return False
+    return True
+
+
+def _previous_siblings(element: HTMLElement) -> Iterator[HTMLElement]:
+    """ the element siblings before element, nearest first """
+    sibling = element._prev
+    while sibling is not None:
+        yield sibling
+        sibling = sibling._prev
+
+
+def _match(element: HTMLElement, selector: Complex, root: HTMLElement, position: int = -1) -> bool:
+    """ match right to left following parent pointers, never looking above root """
+    if position == -1:
+        position = len(selector.compounds) - 1
+    if not _match_compound(element, selector.compounds[position]):
+        return False
+    if position == 0:
+        return True
+    combinator = selector.combinators[position - 1]
+    if element is root or element.parent is None:
+        return False
+    if combinator == '>':
+        return _match(element.parent, selector, root, position - 1)
+    if combinator == ' ':
+        ancestor = element
+        while ancestor is not root and ancestor.parent is not None:
+            ancestor = ancestor.parent
+            if _match(ancestor, selector, root, position - 1):
+                return True
+        return False
+    for sibling in _previous_siblings(element):
+        if _match(sibling, selector, root, position - 1):
+            return True
+        if combinator == '+':
+            return False
+    return False
+
+
+def _candidates(root: HTMLElement, selector: Complex) -> Optional[List[HTMLElement]]:
+    """ the elements that may match the rightmost compound from the id registry or the indexes, None to scan """
+    compound = selector.compounds[-1]
+    if compound.id is not None:
+        element = HTMLElement.get_element_by_id(root, compound.id)
+        return [element] if element is not None else []
+    index = root._index()
+    if index is None:
+        return None
+    buckets = [index.classes.get(name) for name in compound.classes]
+    buckets += [index.attrs.get((name, value)) for name, op, value in compound.attrs if op == '=']
+    if compound.tag is not None:
+        buckets.append(index.tags.get(compound.tag))
+    if not buckets:
+        return None
+    smallest = min(buckets, key=lambda bucket: len(bucket) if bucket else 0)
+    return HTMLElement._from_index(root, index, smallest)
+
+
+def _iter_select(root: HTMLElement, selector: Selector) -> Iterator[HTMLElement]:
+    if len(selector) == 1:
+        candidates = _candidates(root, selector[0])
+        if candidates is not None:
+            yield from (element for element in candidates if _match(element, selector[0], root))
+            return
+    else:
+        index = root._index()
+        groups = [_candidates(root, complex) for complex in selector] if index is not None else [None]
+        if index is not None and all(group is not None for group in groups):
+            found = {
+                element: None
+                for complex, group in zip(selector, groups) if group is not None
+                for element in group if _match(element, complex, root)
+            }
+            order = index.ordered(root.root)
+            yield from sorted(found, key=order.__getitem__)
+            return
+    for element in HTMLElement.iter_preorder(root):
+        if any(_match(element, complex, root) for complex in selector):
+            yield element
+
+
+def select(root: HTMLElement, selector: str) -> List[HTMLElement]:
+    """ all the elements of the tree of root (root included) matching the selector, in document order """
+    return list(_iter_select(root, compile_selector(selector)))
+
+
+def select_one(root: HTMLElement, selector: str) -> Optional[HTMLElement]:
+    """ the first element in document order matching the selector or None """
+    return next(_iter_select(root, compile_selector(selector)), None)
@@ -0,0 +1,78 @@
+import copy
+import pickle
+import pytest
+from HTML.HTMLElement import HTMLElement, LazyElement
+from HTML.binary import dumps, loads
+
+
+@pytest.fixture
+def fixture_tree():
+    rows = [HTMLElement('tr', value=[HTMLElement('td', value=f'cell {i}', attrs={'class': 'num'})]) for i in range(3)]
+    table = HTMLElement('table', value=rows, attrs={'id': 'grid'})
+    return HTMLElement('div', value=['title', table, HTMLElement('p', value='Ünïcode', attrs={'id': 'last'})])
+
+
+def test_round_trip(fixture_tree):
+    data = dumps(fixture_tree)
+    tree = loads(data)
+    assert HTMLElement.render(tree) == HTMLElement.render(fixture_tree)
+    assert HTMLElement.get_element_by_id(tree, 'last').text == 'Ünïcode'
+    assert data.count(b'num') == 1
+
+
+def test_loads_invalid():
+    with pytest.raises(ValueError):
+        loads(b'not a tree')
+
+
+def test_dict_round_trip_any_depth():
+    root = HTMLElement('div', value='root')
+    node = root
+    for i in range(3000):
+        child = HTMLElement('div', value=f'level {i}', attrs={'id': f'd{i}'})
+        HTMLElement.append(node, child)
+        node = child
+    copy = HTMLElement.from_dict(root.to_dict())
+    assert HTMLElement.render(copy) == HTMLElement.render(root)
+    assert HTMLElement.render(loads(dumps(root))) == HTMLElement.render(root)
+
+
+def test_dedup_identical_sub_trees():
+    card = [HTMLElement('div', attrs={'class': 'card'}, value=[HTMLElement('p', value='same'), HTMLElement('a', value='more')])
+            for _ in range(20)]
+    root = HTMLElement('body', value=card + [HTMLElement('p', value='end', attrs={'id': 'end'})])
+    data = dumps(root, dedup=True)
+    assert len(data) < len(dumps(root)) / 3
+    tree = loads(data)
+    assert HTMLElement.render(tree) == HTMLElement.render(root)
+    assert HTMLElement.tree_equal(tree, root)
+    assert tree.children[1]._attrs is tree.children[0]._attrs
+    tree.children[1].children[0].text = 'changed'
+    assert tree.children[0].children[0].text == 'same'
+    assert tree.children[1]._document() is tree._document()
+    assert HTMLElement.get_element_by_id(tree, 'end') is tree.children[-1]
+
+
+def test_pickle_deep_tree(fixture_tree):
+    node = HTMLElement.get_element_by_id(fixture_tree, 'last')
+    for i in range(5000):
+        child = HTMLElement('div', value=f'level {i}', attrs={'id': f'd{i}'})
+        HTMLElement.append(node, child)
+        node = child
+    data = pickle.dumps(fixture_tree)
+    tree = pickle.loads(data)
+    assert HTMLElement.render(tree) == HTMLElement.render(fixture_tree)
+    assert HTMLElement.get_element_by_id(tree, 'd4999').parent is HTMLElement.get_element_by_id(tree, 'd4998')
+    table = pickle.loads(pickle.dumps(fixture_tree.children[0]))
+    assert table.parent is None and HTMLElement.get_element_by_id(table, 'grid') is table
+    assert HTMLElement.tree_equal(copy.deepcopy(fixture_tree), fixture_tree)
+    with pytest.raises(TypeError):
+        pickle.dumps(HTMLElement('div', value=[LazyElement('table', [])]))
+
+
+def test_pickle_non_str_attr_values():
+    root = HTMLElement('div', value=[HTMLElement('p', value='a&b', attrs={'data-n': 1, 'id': 'p'})])
+    tree = pickle.loads(pickle.dumps(root))
+    assert HTMLElement.render(tree) == HTMLElement.render(root)
+    assert HTMLElement.get_element_by_id(tree, 'p').attrs['data-n'] == '1'
+    assert HTMLElement.render(loads(dumps(root, dedup=True))) == HTMLElement.render(root)
@@ -0,0 +1,90 @@
+import json
+import random
+import pytest
+from HTML.HTMLElement import HTMLElement
+from HTML.diff import apply_patch, diff
+
+
+def build_list(keys, texts=None):
+    texts = texts or {}
+    return HTMLElement('nav', attrs={'id': 'list'}, value=[
+        HTMLElement('a', value=texts.get(key, f'item {key}'), attrs={'id': f'k{key}'}) for key in keys
+    ])
+
+
+def test_diff_keyed_moves_are_minimal():
+    old = build_list(range(10))
+    new = build_list([0, 1, 2, 9, 3, 4, 5, 6, 7, 8], texts={4: 'changed'})
+    patch = diff(old, new)
+    assert patch == [
+        {'op': 'move', 'path': [], 'from': 9, 'to': 3},
+        {'op': 'set_text', 'path': [5], 'text': 'changed'},
+    ]
+    assert HTMLElement.render(apply_patch(old, patch)) == HTMLElement.render(new)
+
+
+def test_diff_insert_remove_and_attrs():
+    old = HTMLElement('div', value=[
+        HTMLElement('p', value='a', attrs={'class': 'x'}),
+        build_list([1, 2, 3]),
+        HTMLElement('span', value='gone'),
+    ])
+    new = HTMLElement('div', value=[
+        HTMLElement('p', value='a', attrs={'title': 't'}),
+        build_list([3, 4, 1]),
+        HTMLElement('h2', value='new', attrs={'id': 'k2'}),
+    ])
+    patch = HTMLElement.diff(old, new)
+    assert json.loads(json.dumps(patch)) == patch
+    assert [op['op'] for op in patch[:2]] == ['remove', 'remove']
+    assert HTMLElement.render(HTMLElement.apply_patch(old, patch)) == HTMLElement.render(new)
+    assert HTMLElement.get_element_by_id(old, 'k2').name == 'h2'
+    assert diff(old, new) == []
+
+
+def test_diff_random_round_trip():
+    rng = random.Random(7)
+    for _ in range(20):
+        keys = list(range(30))
+        old = build_list(keys)
+        rng.shuffle(keys)
+        keys = keys[:rng.randint(10, 30)] + list(range(30, 35))
+        new = build_list(keys, texts={key: 'updated' for key in keys if rng.random() < 0.2})
+        assert HTMLElement.render(apply_patch(old, diff(old, new))) == HTMLElement.render(new)
+
+
+def test_diff_root_replace():
+    old = HTMLElement('div', value='old')
+    new = HTMLElement('header', value=[HTMLElement('p', value='new')])
+    assert HTMLElement.render(apply_patch(old, diff(old, new))) == HTMLElement.render(new)
+
+
+def test_diff_many_siblings():
+    old = build_list(range(3000))
+    new = build_list(list(reversed(range(2000))) + list(range(3000, 4000)))
+    patch = diff(old, new)
+    assert sum(op['op'] == 'move' for op in patch) == 1999
+    assert HTMLElement.tree_equal(apply_patch(old, patch), new)
+
+
+def test_insert_before():
+    first, second = HTMLElement('a', value='1'), HTMLElement('a', value='2')
+    root = HTMLElement('nav', value=[first, second])
+    HTMLElement.insert_before(root, second, first)
+    assert root.children == [second, first]
+    third = HTMLElement('a', value='3')
+    HTMLElement.insert_before(root, third, first)
+    HTMLElement.insert_before(root, second, None)
+    assert root.children == [third, first, second]
+    with pytest.raises(ValueError):
+        HTMLElement.insert_before(root, HTMLElement('a', value='4'), HTMLElement('a', value='5'))
+
+
+def test_diff_keeps_attr_order():
+    old = HTMLElement('div', value=[HTMLElement('p', value='x', attrs={'class': 'a', 'title': 't'})])
+    new = HTMLElement('div', value=[HTMLElement('p', value='x', attrs={'lang': 'en', 'class': 'b', 'title': 't'})])
+    patch = diff(old, new)
+    assert patch == [{'op': 'set_attrs', 'path': [0], 'attrs': {'lang': 'en', 'class': 'b', 'title': 't'}}]
+    apply_patch(old, patch)
+    assert diff(old, new) == [] and HTMLElement.tree_equal(old, new)
+    assert HTMLElement.etag(old) == HTMLElement.etag(new)
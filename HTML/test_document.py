@@ -0,0 +1,56 @@
+import io
+import pytest
+from HTML.HTMLDocument import HTMLDocument
+from HTML.HTMLElement import HTMLElement
+
+
+@pytest.fixture
+def fixture_tree():
+    return HTMLElement('body', value=[
+        HTMLElement('div', attrs={'id': 'main', 'class': 'card wide'}, value=[
+            HTMLElement('p', value='a < b', attrs={'class': 'card'}),
+            HTMLElement('p', value='two', attrs={'data-i': '2'}),
+        ]),
+        HTMLElement('p', value='after', attrs={'data-i': '2'}),
+    ])
+
+
+def test_document_round_trip(fixture_tree):
+    document = HTMLDocument.from_element(fixture_tree)
+    assert len(document) == 5
+    assert document.render() == HTMLElement.render(fixture_tree)
+    stream = io.StringIO()
+    document.render_to(stream, node=1, space=4)
+    assert stream.getvalue() == HTMLElement.render(fixture_tree.children[0], 4)
+    element = document.to_element()
+    assert HTMLElement.render(element) == HTMLElement.render(fixture_tree)
+    assert HTMLElement.get_element_by_id(element, 'main').name == 'div'
+
+
+def test_document_queries(fixture_tree):
+    document = HTMLDocument.from_element(fixture_tree)
+    main = document.get_element_by_id('main')
+    assert main == 1 and document.name(main) == 'div' and document.attrs(main)['class'] == 'card wide'
+    assert document.children(main) == [2, 3] and document.parent(main) == 0
+    assert document.text(2) == 'a < b' and document.text(main) is None
+    assert document.find_element_by_tag_name('p') == [2, 3, 4]
+    assert document.find_element_by_tag_name('p', main) == [2, 3]
+    assert document.find_element_by_attrs('data-i', '2') == [3, 4]
+    assert document.find_element_by_class('card') == [1, 2]
+    assert document.find_element_by_tag_name('span') == []
+
+
+def test_document_append_out_of_order(fixture_tree):
+    document = HTMLDocument.from_element(fixture_tree)
+    added = document.append(1, 'p', 'late', {'class': 'card'})
+    assert list(document.iter_preorder()) == [0, 1, 2, 3, added, 4]
+    assert document.find_element_by_tag_name('p') == [2, 3, added, 4]
+    assert document.find_element_by_class('card', 1) == [1, 2, added]
+    assert HTMLElement.render(document.to_element()) == document.render()
+    with pytest.raises(Exception) as e:
+        document.append(0, 'p', attrs={'id': 'main'})
+    assert str(e.value) == 'Duplicate ID, Faild to append'
+    with pytest.raises(Exception):
+        document.append(0, 'invalid_tag')
+    with pytest.raises(ValueError):
+        document.append(None, 'div')
@@ -1,5 +1,10 @@
+import asyncio
+import gzip
+import io
+import json
+import zlib
 import pytest
-from HTML.HTMLElement import HTMLElement
+from HTML.HTMLElement import NUMBER_DEPTH, HTMLElement, LazyElement
 @pytest.fixture
 def fixture_element():
     element1 = HTMLElement('h1', value='Ayosh', attrs={'id': 'id1', 'class': 'myClass'})
@@ -33,6 +38,11 @@ def test_append_negative(fixture_element) -> None:
     with pytest.raises(Exception) as e:
         HTMLElement.append(element1, element2)
     assert str(e.value) == "Duplicate ID, Faild to append"
+    for element in (HTMLElement('div', value=[]), HTMLElement('p', value='text')):
+        with pytest.raises(Exception) as e:
+            HTMLElement.append(element, element)
+        assert str(e.value) == 'Cannot append an element to its own sub tree'
+        assert element.parent is None and element.root is element
     
 def test_render(fixture_element) -> None:
     element1, _, _ = fixture_element
@@ -69,14 +79,43 @@ def test_clone(fixture_element) -> None:
     result_clone = HTMLElement.clone(element1.parent, element1)
     assert result_clone.attrs['id'].startswith('id1_clone')
 
-def test_to_dict(fixture_element) -> None:
+def test_clone_ids_unique_in_target(fixture_element) -> None:
+    element1, element2, element3 = fixture_element
+    HTMLElement.append(element1, [element2, element3])
+    HTMLElement.append(element1, HTMLElement('p', value='taken', attrs={'id': 'id2_clone1'}))
+    first = HTMLElement.clone(element1, element2)
+    HTMLElement.append(element1, first)
+    second = HTMLElement.clone(element1, element2)
+    HTMLElement.append(element1, second)
+    assert first.attrs['id'] == 'id2_clone2' and second.attrs['id'] == 'id2_clone3'
+    assert HTMLElement.render(first) == HTMLElement.render(element2).replace('id2', 'id2_clone2')
+
+def test_clone_share_copy_on_write(fixture_element) -> None:
     element1, _, _ = fixture_element
+    child = HTMLElement('p', value='shared', attrs={'class': 'note'})
+    HTMLElement.append(element1, child)
+    copy = HTMLElement.clone(None, element1, share=True)
+    copy_child = copy.children[0]
+    assert copy_child._attrs is child._attrs
+    copy_child.attrs['class'] = 'changed'
+    assert child.attrs['class'] == 'note' and copy_child.attrs['class'] == 'changed'
+    del child.attrs['class']
+    assert child.attrs == {} and copy.attrs['id'] == 'id1_clone1'
+
+def test_to_dict(fixture_element) -> None:
+    element1, element2, _ = fixture_element
+    HTMLElement.append(element1, element2)
     element_dict = element1.to_dict()
     assert isinstance(element_dict, dict)
+    assert element_dict['value'] == 'Ayosh'
+    assert element_dict['children'][0] == {
+        "name": "h2", "value": "backend training", "attrs": {"id": "id2"}, "children": [],
+    }
+    assert HTMLElement.render(HTMLElement.from_dict(element_dict)) == HTMLElement.render(element1)
 
     
 def test_from_dict() -> None:
-    dict_element = {
+    dict_element: dict = {
         "name": "h1",
         "value": "Ayosh",
         "attrs": {
@@ -86,6 +125,11 @@ def test_from_dict() -> None:
     }
     element_html = HTMLElement.from_dict(dict_element)
     assert isinstance(element_html, HTMLElement)
+    dict_element['children'] = [{'name': 'p', 'value': 'a'}, None, {'name': 'p', 'value': 'b'}]
+    assert [child.text for child in HTMLElement.from_dict(dict_element).children] == ['a', 'b']
+    dict_element['children'] = [{'name': 'p', 'value': 'a'}, 5]
+    with pytest.raises(TypeError):
+        HTMLElement.from_dict(dict_element)
     
 def test_check_update_id(fixture_element):
     element1, element2, element3 = fixture_element
@@ -96,6 +140,472 @@ def test_check_update_id(fixture_element):
 
 def test_render_html_file(fixture_element):
     element1, element2, _ = fixture_element
-    assert HTMLElement.render_html_file(element1) == '<!DOCTYPE html>\n<html>\n    <h1 id="id1" class="myClass">Ayosh\n    </h1>\n</html>\n'
-    
-    
+    file_html = io.StringIO()
+    HTMLElement.render_html_file(element1, file_html)
+    assert file_html.getvalue() == '<!DOCTYPE html>\n<html>\n    <h1 id="id1" class="myClass">Ayosh\n    </h1>\n</html>\n'
+
+def test_compile_template():
+    title = HTMLElement('h1', value='{title}', attrs={'id': 'title', 'class': '{kind}'})
+    script = HTMLElement('script', value='if (a) { b() }')
+    page = HTMLElement('div', value=[title, script, HTMLElement('p', value='{title} {{body}}')])
+    template = HTMLElement.compile(page)
+    assert template.fields == ('kind', 'title')
+    values = {'title': 'Hi', 'kind': 'main'}
+    filled = HTMLElement('div', value=[
+        HTMLElement('h1', value='Hi', attrs={'id': 'title', 'class': 'main'}),
+        HTMLElement('script', value='if (a) { b() }'),
+        HTMLElement('p', value='Hi {body}'),
+    ])
+    assert template(values) == HTMLElement.render(filled)
+    assert template(values, title='Hi') == template(**values)
+    with pytest.raises(KeyError):
+        template({'title': 'Hi'})
+
+def test_render_html_file_path(fixture_element, tmp_path):
+    element1, _, _ = fixture_element
+    path = tmp_path / 'index.html'
+    HTMLElement.render_html_file(element1, path)
+    assert path.read_text() == '<!DOCTYPE html>\n<html>\n    <h1 id="id1" class="myClass">Ayosh\n    </h1>\n</html>\n'
+
+def test_iter_render(fixture_element):
+    element1, element2, element3 = fixture_element
+    HTMLElement.append(element1, [element2, element3])
+    chunks = list(HTMLElement.iter_render(element1))
+    assert ''.join(chunks) == HTMLElement.render(element1)
+    assert HTMLElement.render(element1) == (
+        '<h1 id="id1" class="myClass">Ayosh\n'
+        '    <h2 id="id2">backend training\n    </h2>\n'
+        '\n'
+        '    <div id="id3">test\n    </div>\n'
+        '</h1>\n'
+    )
+
+def test_render_to(fixture_element):
+    element1, element2, _ = fixture_element
+    HTMLElement.append(element1, element2)
+    stream = io.StringIO()
+    HTMLElement.render_to(element1, stream)
+    assert stream.getvalue() == HTMLElement.render(element1)
+
+def test_render_cache(fixture_element):
+    element1, element2, element3 = fixture_element
+    element4 = HTMLElement('p', value='leaf')
+    HTMLElement.append(element1, [element2, element3])
+    HTMLElement.append(element3, element4)
+    stats = HTMLElement.RENDER_CACHE_STATS
+    assert HTMLElement.render(element1, cache=True) == HTMLElement.render(element1)
+    hits = stats['hits']
+    assert HTMLElement.render(element1, cache=True) == HTMLElement.render(element1)
+    assert stats['hits'] == hits + 1
+    element4.attrs['class'] = 'new'
+    assert element2._cache is not None and element3._cache is None and element1._cache is None
+    misses = stats['misses']
+    assert HTMLElement.render(element1, space=0, cache=True) == HTMLElement.render(element1)
+    assert stats['misses'] == misses + 3
+    assert HTMLElement.render(element3, space=4, cache=True) in HTMLElement.render(element1, cache=True)
+    HTMLElement.remove(element1, element4)
+    HTMLElement.append(element2, ' more')
+    assert HTMLElement.render(element1, cache=True) == HTMLElement.render(element1)
+    HTMLElement.clear_render_cache(element1)
+    assert element1._cache is None and element2._cache is None
+
+
+def test_walk_orders(fixture_element):
+    element1, element2, element3 = fixture_element
+    element4 = HTMLElement('p', value='leaf')
+    HTMLElement.append(element1, [element2, element3])
+    HTMLElement.append(element2, element4)
+    assert list(HTMLElement.iter_preorder(element1)) == [element1, element2, element4, element3]
+    assert list(HTMLElement.iter_postorder(element1)) == [element4, element2, element3, element1]
+    assert list(HTMLElement.iter_breadth_first(element1)) == [element1, element2, element3, element4]
+    pruned = list(HTMLElement.iter_preorder(element1, prune=lambda el: el is element2))
+    assert pruned == [element1, element2, element3]
+
+def test_deep_tree_no_recursion_error():
+    root = HTMLElement('div', value='root')
+    node = root
+    for _ in range(5000):
+        child = HTMLElement('div', value='x')
+        HTMLElement.append(node, child)
+        node = child
+    HTMLElement.append(node, HTMLElement('p', value='bottom', attrs={'id': 'bottom'}))
+    assert HTMLElement.render(root).count('<div>') == 5001
+    assert HTMLElement.find_element_by_attrs(root, 'id', 'bottom')[0].name == 'p'
+    assert len(HTMLElement.find_element_by_tag_name(HTMLElement.clone(None, root), 'div')) == 5001
+
+def test_get_element_by_id(fixture_element):
+    element1, element2, element3 = fixture_element
+    HTMLElement.append(element2, element3)
+    HTMLElement.append(element1, element2)
+    assert HTMLElement.get_element_by_id(element1, 'id3') is element3
+    assert HTMLElement.get_element_by_id(element2, 'id1') is None
+    assert element1.ids == {'id1', 'id2', 'id3'}
+
+def test_id_registry_follows_remove_and_attrs(fixture_element):
+    element1, element2, element3 = fixture_element
+    HTMLElement.append(element1, [element2, element3])
+    HTMLElement.remove(element1, element2)
+    assert not element1.check_update_id('id2')
+    HTMLElement.append(element1, HTMLElement('p', value='again', attrs={'id': 'id2'}))
+    element3.attrs['id'] = 'renamed'
+    assert HTMLElement.get_element_by_id(element1, 'renamed') is element3
+    assert not element1.check_update_id('id3')
+    with pytest.raises(Exception) as e:
+        element3.attrs['id'] = 'id1'
+    assert str(e.value) == "Duplicate ID, Faild to append"
+
+def test_append_subtree_duplicate_id(fixture_element):
+    element1, element2, element3 = fixture_element
+    HTMLElement.append(element1, element2)
+    subtree = HTMLElement('div', value=[HTMLElement('p', value='x', attrs={'id': 'id2'})])
+    with pytest.raises(Exception):
+        HTMLElement.append(element3, [subtree, element1])
+    with pytest.raises(Exception):
+        HTMLElement.append(element2, element1)
+
+def test_index_lookups_in_document_order(fixture_element):
+    element1, element2, element3 = fixture_element
+    HTMLElement.create_index(element1)
+    HTMLElement.append(element1, element2)
+    HTMLElement.append(element1, element3)
+    paragraph = HTMLElement('p', value='late', attrs={'class': 'myClass note'})
+    HTMLElement.append(element2, paragraph)
+    assert HTMLElement.find_element_by_class(element1, 'myClass') == [element1, paragraph]
+    assert HTMLElement.find_element_by_class(element2, 'myClass') == [paragraph]
+    assert HTMLElement.find_element_by_attrs(element1, 'id', 'id3') == [element3]
+    element3.attrs['class'] = 'note'
+    assert HTMLElement.find_element_by_class(element1, 'note') == [paragraph, element3]
+    element3.name = 'p'
+    assert HTMLElement.find_element_by_tag_name(element1, 'p') == [paragraph, element3]
+    HTMLElement.remove(element1, element2)
+    assert HTMLElement.find_element_by_tag_name(element1, 'p') == [element3]
+    assert HTMLElement.find_element_by_tag_name(element2, 'p') == [paragraph]
+
+def test_compact_element():
+    leaf = HTMLElement('p', value='text')
+    other = HTMLElement('span', value=[])
+    assert not hasattr(leaf, '__dict__')
+    assert leaf._attrs is other._attrs and leaf._first is None
+    leaf.attrs['class'] = 'note'
+    assert other.attrs == {} and leaf.attrs == {'class': 'note'}
+    HTMLElement.append(leaf, [' more', other])
+    assert leaf.value == ['text more', other]
+    assert leaf.text == 'text more' and leaf.children == [other]
+
+def test_detach(fixture_element):
+    element1, element2, element3 = fixture_element
+    element4 = HTMLElement('p', value='leaf', attrs={'id': 'id4'})
+    HTMLElement.append(element1, [element2, element3])
+    HTMLElement.append(element3, element4)
+    assert element3.detach() is element3
+    assert element1.children == [element2] and element3.parent is None
+    assert element1.ids == {'id1', 'id2'} and element3.ids == {'id3', 'id4'}
+    assert HTMLElement.remove(element1, element4) is None
+    HTMLElement.append(element1, element3)
+    HTMLElement.detach_all([element2, element4, element3])
+    assert element1.children == [] and element3.children == []
+    assert element1.ids == {'id1'} and element3.ids == {'id3'} and element4.ids == {'id4'}
+
+def test_parse_round_trip(fixture_element):
+    element1, element2, element3 = fixture_element
+    HTMLElement.append(element1, [element2, element3])
+    HTMLElement.append(element3, HTMLElement('input', value=[], attrs={'name': 'q'}))
+    html = HTMLElement.render(element1)
+    parsed = HTMLElement.parse(html)
+    assert HTMLElement.render(parsed) == html
+    assert HTMLElement.get_element_by_id(parsed, 'id3').children[0].name == 'input'
+    chunks = [html[i:i + 5] for i in range(0, len(html), 5)]
+    assert HTMLElement.render(HTMLElement.parse(chunks)) == html
+    file_html = io.StringIO()
+    HTMLElement.render_html_file(element1, file_html)
+    file_html.seek(0)
+    assert HTMLElement.render(HTMLElement.parse(file_html).children[0]) == html
+
+def test_parse_invalid():
+    with pytest.raises(Exception) as e:
+        HTMLElement.parse('<div><p id="a">x</p><p id="a">y</p></div>')
+    assert str(e.value) == 'Duplicate ID a, Faild to parse'
+    with pytest.raises(Exception) as e:
+        HTMLElement.parse('<div><blink>x</blink></div>')
+    assert str(e.value) == 'blink not vaild name of tag in the HTML'
+    with pytest.raises(ValueError):
+        HTMLElement.parse('<p>a</p><p>b</p>')
+
+def test_insert(fixture_element):
+    element1, element2, element3 = fixture_element
+    HTMLElement.create_index(element1)
+    HTMLElement.append(element1, element2)
+    HTMLElement.insert(element1, 0, element3)
+    assert element1.children == [element3, element2]
+    HTMLElement.insert(element1, 5, element3)
+    assert element1.children == [element2, element3]
+    assert HTMLElement.find_element_by_attrs(element1, 'id', 'id3') == [element3]
+    assert HTMLElement.find_element_by_tag_name(element1, 'h2') == [element2]
+
+def test_lazy_element():
+    def row(number):
+        return HTMLElement('tr', value=[HTMLElement('td', value=str(number))])
+    table = LazyElement('table', row, count=3, attrs={'id': 'table'}, value=[HTMLElement('tr', value='head')])
+    page = HTMLElement('div', value=[table, HTMLElement('p', value='after')])
+    eager = HTMLElement('div', value=[
+        HTMLElement('table', attrs={'id': 'table'}, value=[HTMLElement('tr', value='head')] + [row(i) for i in range(3)]),
+        HTMLElement('p', value='after'),
+    ])
+    assert HTMLElement.render(page) == HTMLElement.render(eager)
+    assert table.children == [table.children[0]]
+    stream = io.StringIO()
+    HTMLElement.render_to(HTMLElement.clone(None, page), stream)
+    assert stream.getvalue() == HTMLElement.render(eager).replace('"table"', '"table_clone1"')
+    assert HTMLElement.render(page, cache=True) == HTMLElement.render(eager)
+    assert table._cache is None and page._cache is None and page.children[1]._cache is not None
+    once = LazyElement('table', iter([row(0)]))
+    HTMLElement.render(once)
+    with pytest.raises(ValueError):
+        HTMLElement.render(once)
+    duplicate = LazyElement('table', lambda: [HTMLElement('tr', value='x', attrs={'id': 'table'})])
+    HTMLElement.append(page, duplicate)
+    with pytest.raises(Exception) as e:
+        HTMLElement.render(page)
+    assert str(e.value) == 'Duplicate ID table, Faild to render'
+
+def test_render_escapes_attrs_and_text():
+    element = HTMLElement('p', value='a < b & c', attrs={'title': 'say "hi" <now>'})
+    script = HTMLElement('script', value='if (a < b && c) {}', attrs={'src': 'a.js?x=1&y=2'})
+    page = HTMLElement('div', value=[element, script])
+    assert HTMLElement.render(element) == '<p title="say &quot;hi&quot; &lt;now&gt;">a &lt; b &amp; c\n</p>\n'
+    assert '<script src="a.js?x=1&amp;y=2">if (a < b && c) {}\n' in HTMLElement.render(script)
+    assert HTMLElement.render(HTMLElement.parse(HTMLElement.render(page))) == HTMLElement.render(page)
+    element.attrs['title'] = 'plain'
+    assert HTMLElement.render(element) == '<p title="plain">a &lt; b &amp; c\n</p>\n'
+    element.text = 'x'
+    del element.attrs['title']
+    assert HTMLElement.render(element) == '<p>x\n</p>\n'
+    element.name = 'span'
+    assert HTMLElement.render(element) == '<span>x\n</span>\n'
+    template = HTMLElement.compile(HTMLElement('a', value='{label}', attrs={'href': '{url}'}))
+    assert template(label='<b>', url='/?a=1&b="2"') == '<a href="/?a=1&amp;b=&quot;2&quot;">&lt;b&gt;\n</a>\n'
+    assert HTMLElement.render(HTMLElement('p', value='a&b', attrs={'data-n': 5})) == '<p data-n="5">a&amp;b\n</p>\n'
+    script = HTMLElement('script', value='var x = "{code}";', attrs={'src': '{src}'})
+    template = HTMLElement.compile(HTMLElement('div', value=[script, HTMLElement('p', value='{code}')]))
+    html = template(code='a<b', src='x&y')
+    assert 'var x = "a<b";' in html and '<p>a&lt;b' in html and 'src="x&amp;y"' in html
+    assert template.fields == ('src', 'code')
+
+def test_arender_yields_to_event_loop():
+    root = HTMLElement('body', value=[HTMLElement('p', value=f'p {i}') for i in range(2000)])
+
+    class Writer:
+        def __init__(self):
+            self.data = b''
+            self.drains = 0
+
+        def write(self, data):
+            self.data += data
+
+        async def drain(self):
+            self.drains += 1
+
+    async def main():
+        ticks = 0
+        done = False
+
+        async def ticker():
+            nonlocal ticks
+            while not done:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        task = asyncio.create_task(ticker())
+        writer = Writer()
+        await HTMLElement.arender(root, writer, every=100)
+        first = await HTMLElement.aiter_render(root, every=10).__anext__()
+        done = True
+        await task
+        return writer, ticks, first
+
+    writer, ticks, first = asyncio.run(main())
+    assert writer.data.decode() == HTMLElement.render(root)
+    assert writer.drains >= 20 and ticks >= 20
+    assert HTMLElement.render(root).startswith(first) and len(first) < 200
+
+def test_is_ancestor_intervals(fixture_element):
+    element1, element2, element3 = fixture_element
+    element4 = HTMLElement('p', value='leaf')
+    HTMLElement.append(element1, [element2, element3])
+    HTMLElement.append(element2, element4)
+    assert HTMLElement.is_ancestor(element1, element4) and not HTMLElement.is_ancestor(element3, element4)
+    HTMLElement.create_index(element1)
+    index = element1._index()
+    assert index.order[element2] == 1 and index.ends[element2] == 2 and index.ends[element1] == 3
+    assert HTMLElement.is_ancestor(element2, element4) and HTMLElement.is_ancestor(element4, element4)
+    assert not HTMLElement.is_ancestor(element4, element2) and not HTMLElement.is_ancestor(element3, element4)
+    element5 = HTMLElement('p', value='end')
+    HTMLElement.append(element3, element5)
+    assert index.order is not None and index.ends[element1] == 4
+    HTMLElement.append(element2, HTMLElement('p', value='middle'))
+    assert index.order is None
+    assert HTMLElement.find_element_by_tag_name(element2, 'p') == [element4, element2.children[1]]
+    assert HTMLElement.find_element_by_tag_name(element3, 'p') == [element5]
+    assert HTMLElement.is_ancestor(element3, element5) and not HTMLElement.is_ancestor(element1, HTMLElement('p', value='x'))
+    assert HTMLElement.remove(element2, element5) is None
+    assert HTMLElement.remove(element1, element5) is element5
+    with pytest.raises(Exception):
+        HTMLElement.append(element4, element1)
+
+def test_deep_indexed_appends_renumber_lazily():
+    root = HTMLElement('div', value=[])
+    HTMLElement.create_index(root)
+    index = root._index()
+    node = root
+    for depth in range(NUMBER_DEPTH + 10):
+        child = HTMLElement('p' if depth % 2 else 'div', value=[])
+        HTMLElement.append(node, child)
+        node = child
+        assert (index.order is not None) == (depth < NUMBER_DEPTH)
+    assert HTMLElement.find_element_by_tag_name(root, 'p') == [n for n in HTMLElement.iter_preorder(root) if n.name == 'p']
+    assert index.order is not None and HTMLElement.is_ancestor(root.children[0], node)
+
+def test_index_queries_after_remove_and_rename():
+    first, second, other = HTMLElement('p', value='1'), HTMLElement('p', value='2'), HTMLElement('span', value='3')
+    root = HTMLElement('div', value=[first, second, other])
+    HTMLElement.create_index(root)
+    assert HTMLElement.find_element_by_tag_name(root, 'p') == [first, second]
+    HTMLElement.remove(root, second)
+    assert HTMLElement.find_element_by_tag_name(root, 'p') == [first]
+    other.name = 'p'
+    assert HTMLElement.find_element_by_tag_name(root, 'p') == [first, other]
+    assert HTMLElement.find_element_by_tag_name(root, 'span') == []
+
+def test_digest_equality_and_etag(fixture_element):
+    element1, element2, element3 = fixture_element
+    HTMLElement.append(element1, [element2, element3])
+    copy = HTMLElement.from_dict(element1.to_dict())
+    assert HTMLElement.tree_equal(element1, copy) and HTMLElement.etag(element1) == HTMLElement.etag(copy)
+    etag = HTMLElement.etag(element1)
+    element3.attrs['class'] = 'x'
+    assert element1._hash is None and element2._hash is not None
+    assert not HTMLElement.tree_equal(element1, copy) and HTMLElement.etag(element1) != etag
+    del element3.attrs['class']
+    assert HTMLElement.etag(element1) == etag and HTMLElement.etag(element1, 4) != etag
+    assert HTMLElement('p', value='').digest() != HTMLElement('p', value=[]).digest()
+    with pytest.raises(ValueError):
+        LazyElement('table', []).digest()
+
+def test_render_cache_shares_identical_sub_trees():
+    rows = [HTMLElement('tr', value=[HTMLElement('td', value='same')]) for _ in range(50)]
+    table = HTMLElement('table', value=rows)
+    stats = HTMLElement.RENDER_CACHE_STATS
+    hits = stats['hits']
+    assert HTMLElement.render(table, cache=True) == HTMLElement.render(table)
+    assert stats['hits'] == hits and table._document().renders is None
+    HTMLElement.clear_render_cache(table)
+    table.digest()
+    assert HTMLElement.render(table, cache=True) == HTMLElement.render(table)
+    assert stats['hits'] - hits >= 49 and len(table._document().renders) == 1
+    rows[3].children[0].text = 'other'
+    assert HTMLElement.render(table, cache=True) == HTMLElement.render(table)
+
+def test_batch_commit_and_rollback():
+    root = HTMLElement('body', attrs={'id': 'root'}, value=[HTMLElement('div', attrs={'id': 'a'}, value='x')])
+    HTMLElement.create_index(root)
+    before = HTMLElement.render(root, cache=True)
+    with root.batch():
+        for i in range(20):
+            HTMLElement.append(root, HTMLElement('p', attrs={'id': f'p{i}', 'class': 'c'}, value=str(i)))
+        HTMLElement.get_element_by_id(root, 'a').attrs['title'] = 't'
+    assert HTMLElement.get_element_by_id(root, 'p7').text == '7'
+    assert len(HTMLElement.find_element_by_class(root, 'c')) == 20
+    assert HTMLElement.render(root, cache=True) == HTMLElement.render(root) != before
+    committed = HTMLElement.render(root)
+    digest = root.digest()
+    stray = HTMLElement('header', value=[HTMLElement('p', value='dup', attrs={'id': 'a'})])
+    moved = HTMLElement.get_element_by_id(root, 'p0')
+    with pytest.raises(Exception) as e:
+        with root.batch():
+            HTMLElement.insert(root, 5, moved)
+            HTMLElement.get_element_by_id(root, 'p1').detach()
+            HTMLElement.append(root.children[0], 'more')
+            HTMLElement.get_element_by_id(root, 'a').attrs['title'] = 'u'
+            HTMLElement.append(root, stray)
+    assert str(e.value) == 'Duplicate ID, Faild to append'
+    assert HTMLElement.render(root, cache=True) == committed and root.digest() == digest
+    assert HTMLElement.get_element_by_id(root, 'p1').parent is root
+    assert stray.parent is None and HTMLElement.get_element_by_id(stray, 'a') is stray.children[0]
+    assert len(HTMLElement.find_element_by_class(root, 'c')) == 20
+
+def test_render_minify_and_compressed(fixture_element):
+    element1, element2, element3 = fixture_element
+    HTMLElement.append(element1, [element2, element3])
+    minified = HTMLElement.render(element1, minify=True)
+    assert '\n' not in minified and minified.startswith(element1._open)
+    assert minified == ''.join(line.strip() for line in HTMLElement.render(element1).splitlines())
+    table = LazyElement('table', lambda: (HTMLElement('tr', value=[HTMLElement('td', value=str(i))]) for i in range(3)))
+    assert HTMLElement.render(table, minify=True) == '<table>' + ''.join(f'<tr><td>{i}</td></tr>' for i in range(3)) + '</table>'
+    stream = io.BytesIO()
+    HTMLElement.render_compressed(element1, stream, minify=True)
+    assert gzip.decompress(stream.getvalue()).decode() == minified
+    chunks = list(HTMLElement.iter_compressed(element1, 'deflate', space=4))
+    assert zlib.decompress(b''.join(chunks)).decode() == HTMLElement.render(element1, 4)
+    with pytest.raises(ValueError):
+        list(HTMLElement.iter_compressed(element1, 'br'))
+
+
+def test_batch_moves_inside_indexed_tree():
+    root = HTMLElement('body', value=[HTMLElement('p', value='a'), HTMLElement('p', value='b')])
+    HTMLElement.create_index(root)
+    div = HTMLElement('div', value=[])
+    with root.batch():
+        HTMLElement.append(root, div)
+        HTMLElement.append(div, root.children[0])
+        assert HTMLElement.is_ancestor(root, div.children[0])
+        assert HTMLElement.find_element_by_tag_name(div, 'p') == div.children
+    assert [child.name for child in root.children] == ['p', 'div']
+    assert HTMLElement.find_element_by_tag_name(root, 'p') == [root.children[0], div.children[0]]
+
+
+def test_batch_rollback_restores_names_and_values():
+    p = HTMLElement('p', value='a')
+    root = HTMLElement('div', value=[p, HTMLElement('span', value='b', attrs={'id': 'b'})])
+    HTMLElement.create_index(root)
+    before = HTMLElement.render(root)
+    with pytest.raises(ValueError):
+        with root.batch():
+            p.name = 'h1'
+            p.value = 'b'
+            root.children[1].value = [HTMLElement('a', value='link')]
+            raise ValueError('stop')
+    assert p.name == 'p' and p.text == 'a' and HTMLElement.render(root) == before
+    assert HTMLElement.find_element_by_tag_name(root, 'p') == [p]
+    assert HTMLElement.find_element_by_tag_name(root, 'h1') == []
+
+
+def test_value_list_writes_through():
+    p = HTMLElement('p', value='text')
+    div = HTMLElement('div', value=[])
+    div.value.append(p)
+    div.value.append('hello')
+    assert div.children == [p] and div.text == 'hello' and div.value == ['hello', p]
+    value = div.value
+    value.remove(p)
+    assert p.parent is None and value == ['hello'] and div.children == []
+    value += [p]
+    assert p.parent is div
+    with pytest.raises(TypeError):
+        div.value.pop()
+    with pytest.raises(ValueError):
+        div.value.remove(HTMLElement('a', value='x'))
+
+
+def test_attrs_is_a_write_through_dict():
+    element = HTMLElement('p', value='x', attrs={'id': 'a', 'class': 'c'})
+    root = HTMLElement('div', value=[element])
+    attrs = element.attrs
+    assert isinstance(attrs, dict) and json.loads(json.dumps(attrs)) == {'id': 'a', 'class': 'c'}
+    attrs['id'] = 'b'
+    attrs.update(title='t')
+    assert HTMLElement.get_element_by_id(root, 'b') is element and element.attrs == {'id': 'b', 'class': 'c', 'title': 't'}
+    assert attrs.pop('class') == 'c' and attrs.pop('missing', None) is None
+    del attrs['id']
+    assert HTMLElement.get_element_by_id(root, 'b') is None and element.attrs == attrs == {'title': 't'}
+    with pytest.raises(KeyError):
+        del attrs['id']
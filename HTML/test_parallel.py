@@ -0,0 +1,27 @@
+from HTML import binary
+from HTML.HTMLElement import HTMLElement, LazyElement
+from HTML.parallel import _chunks, _render_blobs, render_parallel
+
+
+def build_report(sections):
+    return HTMLElement('body', value=[
+        HTMLElement('div', attrs={'id': f's{i}'}, value=[HTMLElement('p', value=f'row {i} & {j}') for j in range(i % 4)])
+        for i in range(sections)
+    ])
+
+
+def test_render_parallel_matches_render():
+    root = build_report(40)
+    assert render_parallel(root, workers=2, threshold=0) == HTMLElement.render(root)
+    assert render_parallel(root, workers=2, space=4, threshold=0) == HTMLElement.render(root, 4)
+    assert render_parallel(root, workers=2) == HTMLElement.render(root)
+    HTMLElement.append(root, LazyElement('table', lambda: [HTMLElement('tr', value='lazy')]))
+    assert render_parallel(root, workers=2, threshold=0) == HTMLElement.render(root)
+
+
+def test_render_blobs_and_chunks():
+    root = build_report(6)
+    blobs = [binary.dumps(child) for child in root.children]
+    assert _render_blobs(blobs, 4) == '\n'.join(HTMLElement.render(child, 4) for child in root.children)
+    assert _chunks([1, 1, 1, 1, 4], 2) == [(0, 4), (4, 5)]
+    assert _chunks([5], 3) == [(0, 1)]
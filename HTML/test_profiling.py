@@ -0,0 +1,53 @@
+import pytest
+from HTML.HTMLElement import HTMLElement, LazyElement
+from HTML.profiling import profile
+
+
+def test_profile_counters_and_hooks():
+    events = []
+    with HTMLElement.profile() as active:
+        active.on('append', lambda parent, child: events.append(('append', child.name)))
+        active.on('remove', lambda parent, element: events.append(('remove', element.name)))
+        active.on('render', lambda element, chars, seconds: events.append(('render', chars)))
+        with active.phase('build'):
+            root = HTMLElement('div', attrs={'id': 'root'}, value=[
+                HTMLElement('p', value='a', attrs={'id': 'a'}),
+                HTMLElement('header', value='b'),
+            ])
+        html = HTMLElement.render(root)
+        assert HTMLElement.find_element_by_tag_name(root, 'p')[0].text == 'a'
+        assert HTMLElement.find_element_by_attrs(html_element=root, attr='id', value='a')[0].text == 'a'
+        indented = HTMLElement.render(element=root, space=4)
+        assert HTMLElement.remove(root, HTMLElement.get_element_by_id(root, 'a')) is not None
+        with pytest.raises(RuntimeError):
+            with profile():
+                pass
+    counters = active.counters
+    assert counters['appends'] == 2 and counters['id_checks'] == 1 and counters['removes'] == 1
+    assert counters['renders'] == 2 and counters['render_chars'] == len(html) + len(indented)
+    assert active.queries_log[0][:3] == ('find_element_by_tag_name', 3, 1)
+    assert counters['queries'] == 3 and 'build' in active.timings and 'appends' in active.report()
+    assert events == [('append', 'p'), ('append', 'header'), ('render', len(html)), ('render', len(indented)), ('remove', 'p')]
+    assert HTMLElement.__dict__['append'].__func__.__qualname__ == 'HTMLElement.append'
+    with pytest.raises(ValueError):
+        active.on('clone', print)
+
+
+def test_profile_counts_lazy_rows_once():
+    table = LazyElement('table', lambda: (HTMLElement('tr', value=[HTMLElement('td', value=str(i))]) for i in range(3)))
+    with HTMLElement.profile() as active:
+        html = HTMLElement.render(table)
+    assert active.counters['renders'] == 1 and active.counters['render_chars'] == len(html)
+    assert HTMLElement.__dict__['iter_render'].__func__.__qualname__ == 'HTMLElement.iter_render'
+
+
+def test_profile_counts_bulk_removals():
+    removed = []
+    children = [HTMLElement('p', value=str(i)) for i in range(3)]
+    root = HTMLElement('div', value=children)
+    with HTMLElement.profile() as active:
+        active.on('remove', lambda parent, element: removed.append((parent, element.text)))
+        HTMLElement.detach_all(children[:2])
+        root.value = [HTMLElement('header', value='new')]
+    assert active.counters['removes'] == 3
+    assert removed == [(root, '0'), (root, '1'), (root, '2')]
@@ -0,0 +1,44 @@
+import pytest
+from HTML.HTMLElement import HTMLElement
+from HTML.selector import compile_selector, select, select_one
+
+
+@pytest.fixture
+def fixture_page():
+    intro = HTMLElement('p', value='intro', attrs={'id': 'intro', 'class': 'lead'})
+    other = HTMLElement('p', value='other', attrs={'data-kind': 'note-small'})
+    card = HTMLElement('div', value=[intro, other], attrs={'class': 'card wide'})
+    cell = HTMLElement('td', value='cell', attrs={'class': 'num'})
+    table = HTMLElement('table', value=[HTMLElement('tr', value=[HTMLElement('th', value='head'), cell])])
+    body = HTMLElement('body', value=[card, table])
+    return body, card, intro, other, cell
+
+
+def test_select_group(fixture_page):
+    body, _, intro, _, cell = fixture_page
+    assert select(body, 'div.card > p#intro, table tr td') == [intro, cell]
+
+
+def test_select_combinators(fixture_page):
+    body, card, intro, other, cell = fixture_page
+    assert select(body, 'div p') == [intro, other]
+    assert select(body, 'body > p') == []
+    assert select(body, 'p + p') == [other]
+    assert select(body, 'th ~ td.num') == [cell]
+    assert select(body, '[data-kind|=note]') == [other]
+    assert select(body, '*.wide') == [card]
+    assert select(card, 'body p') == []
+
+
+def test_select_uses_indexes(fixture_page):
+    body, card, intro, other, cell = fixture_page
+    HTMLElement.create_index(body)
+    assert select(body, 'td, .card p') == [intro, other, cell]
+    assert select_one(body, 'p[data-kind]') is other
+    assert select_one(body, 'span') is None
+
+
+def test_compile_selector_cached():
+    assert compile_selector('div.card > p') is compile_selector('div.card > p')
+    with pytest.raises(ValueError):
+        compile_selector('div >')